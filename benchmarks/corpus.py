@@ -0,0 +1,73 @@
+"""Reproducible benchmark inputs built from the 1984 test document."""
+import os
+import random
+
+BOOK = os.path.join(os.path.dirname(__file__), '..', 'test documents', 'book-1984.txt')
+
+
+def book_text():
+    with open(BOOK, 'r') as f:
+        return f.read()
+
+
+def book_paragraphs():
+    return [p.strip() for p in book_text().split('\n\n') if p.strip()]
+
+
+def generate_documents(count, chars, seed=0):
+    """
+    Build count raw documents of about chars characters each from randomly
+    chosen paragraphs of the book; every fourth document is HTML.
+    """
+    rng = random.Random(seed)
+    paragraphs = book_paragraphs()
+    documents = []
+    for i in range(count):
+        parts = []
+        size = 0
+        while size < chars:
+            paragraph = rng.choice(paragraphs)
+            parts.append(paragraph)
+            size += len(paragraph) + 2
+        if i % 4 == 3:
+            text = ''.join(f'<div><p>{part}</p></div>' for part in parts)
+            text = f'<html><body><nav><a href="/">Home</a></nav>{text}<footer>Footer</footer></body></html>'
+            doc_type = 'html'
+        else:
+            text = '\n\n'.join(parts)
+            doc_type = 'text'
+        documents.append({'_id': f'bench-{i}', 'text': text, 'url': f'https://example.com/bench/{i}', 'type': doc_type})
+    return documents
+
+
+def generate_queries(count, seed=0):
+    """Build count search queries of 2 to 10 words taken from the book."""
+    rng = random.Random(seed)
+    words = book_text().split()
+    queries = []
+    for _ in range(count):
+        length = rng.randint(2, 10)
+        start = rng.randrange(len(words) - length)
+        queries.append(' '.join(words[start:start + length]))
+    return queries
+
+
+def synthetic_page(target_chars):
+    """Build a crawled-looking HTML page of roughly target_chars characters."""
+    paragraphs = book_paragraphs()
+    head = (
+        '<html><head><title>Article</title>'
+        '<style>' + 'body { margin: 0; } .nav a { color: #333; } ' * 50 + '</style>'
+        '<script>' + 'window.dataLayer.push({"event": "view", "id": 12345}); ' * 100 + '</script>'
+        '</head><body><nav class="nav">' + '<a href="/section">Section</a> ' * 60 + '</nav><article>'
+    )
+    tail = '</article><aside>Related stories</aside><footer>Copyright, contact, privacy</footer></body></html>'
+    body = []
+    size = len(head) + len(tail)
+    i = 0
+    while size < target_chars:
+        paragraph = f'<div class="para"><p>{paragraphs[i % len(paragraphs)]}</p><span>ad</span></div>'
+        body.append(paragraph)
+        size += len(paragraph)
+        i += 1
+    return head + ''.join(body) + tail
@@ -0,0 +1,60 @@
+"""
+Compare the HTML cleaning backends of src/html_cleaning.py.
+
+Times each backend on synthetic crawled pages (navigation, inline scripts and
+styles around article text taken from the 1984 test document) or on the HTML
+files given on the command line:
+
+    python benchmarks/html_cleaning.py
+    python benchmarks/html_cleaning.py page1.html page2.html --repeat 10
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import synthetic_page
+from src.config import HTML_STRIP_TAGS
+from src.html_cleaning import BACKENDS
+
+
+def time_backend(backend, html, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = BACKENDS[backend](html, HTML_STRIP_TAGS)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='*', help='HTML files to clean instead of the synthetic pages')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per backend; the fastest is reported')
+    parser.add_argument('--backends', nargs='*', default=list(BACKENDS))
+    args = parser.parse_args()
+
+    if args.files:
+        pages = []
+        for path in args.files:
+            with open(path, 'r', errors='replace') as f:
+                pages.append((os.path.basename(path), f.read()))
+    else:
+        pages = [(f'synthetic {size // 1000} KB', synthetic_page(size)) for size in (50_000, 500_000, 5_000_000)]
+
+    print(f"{'page':<22}{'backend':<10}{'seconds':>10}{'MB/s':>10}{'text chars':>12}")
+    for name, html in pages:
+        for backend in args.backends:
+            try:
+                seconds, chars = time_backend(backend, html, args.repeat)
+            except ImportError as e:
+                print(f"{name:<22}{backend:<10}  unavailable: {e}")
+                continue
+            print(f"{name:<22}{backend:<10}{seconds:>10.4f}{len(html) / seconds / 1e6:>10.1f}{chars:>12}")
+
+
+if __name__ == '__main__':
+    main()
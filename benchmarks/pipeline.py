@@ -0,0 +1,234 @@
+"""
+Benchmark the processing pipeline and compare the results with a baseline.
+
+Stages: process_document on the 1984 book and on a generated corpus,
+process_query, HTML cleaning, n-gram extraction and a full
+QueueProcessor.run_queue drain against mongomock as a local MongoDB stand-in.
+Each stage reports latency percentiles, items per second and the peak RSS of
+the process after the stage. Inputs are generated from the book with a fixed
+seed, so runs with the same arguments process the same data.
+
+    pip install -r requirements.txt -r benchmarks/requirements.txt
+    python benchmarks/pipeline.py --save-baseline benchmarks/baseline.json
+    python benchmarks/pipeline.py --baseline benchmarks/baseline.json --threshold 0.2
+
+A stage that raises is reported as failed and the remaining stages still run;
+the results are written and the run exits with status 1. With --baseline, the
+run also fails when any latency percentile or the peak RSS grows, or the
+throughput drops, by more than the threshold, or a baseline stage failed.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import book_text, generate_documents, generate_queries, synthetic_page
+from src.config import DEFAULT_MODEL, NGRAM_SIZES, NGRAM_MIN_FREQUENCY, NGRAM_TOP_K
+from src.html_cleaning import clean_html
+from src.processor import TextTransformer
+from src.utils import extract_ngrams
+
+STAGES = ['book', 'document', 'query', 'html', 'ngrams', 'queue']
+
+# Metrics compared against the baseline and whether higher values are worse
+COMPARED_METRICS = {
+    'p50_ms': True,
+    'p90_ms': True,
+    'p99_ms': True,
+    'items_per_second': False,
+    'peak_rss_mb': True
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, items, elapsed):
+    """Turn per-call latencies (seconds) into the reported metrics of a stage."""
+    ordered = sorted(latencies)
+    return {
+        'calls': len(ordered),
+        'items': items,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p90_ms': percentile(ordered, 0.90) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'items_per_second': items / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def timed(function, inputs):
+    """Call function on each input; return the per-call latencies and the total time."""
+    latencies = []
+    start = time.perf_counter()
+    for value in inputs:
+        call_start = time.perf_counter()
+        function(value)
+        latencies.append(time.perf_counter() - call_start)
+    return latencies, time.perf_counter() - start
+
+
+def bench_book(transformer, args):
+    document = {'_id': 'book-1984', 'text': book_text(), 'url': 'https://example.com/1984'}
+    latencies, elapsed = timed(transformer.process_document, [document] * args.repeat)
+    return summarize(latencies, args.repeat, elapsed)
+
+
+def bench_document(transformer, args):
+    documents = generate_documents(args.docs, args.doc_chars, args.seed)
+    latencies, elapsed = timed(transformer.process_document, documents)
+    return summarize(latencies, len(documents), elapsed)
+
+
+def bench_query(transformer, args):
+    queries = generate_queries(args.queries, args.seed)
+    latencies, elapsed = timed(transformer.process_query, queries)
+    return summarize(latencies, len(queries), elapsed)
+
+
+def bench_html(transformer, args):
+    pages = [synthetic_page(args.doc_chars * 4)] * args.docs
+    latencies, elapsed = timed(clean_html, pages)
+    return summarize(latencies, len(pages), elapsed)
+
+
+def bench_ngrams(transformer, args):
+    token_lists = [
+        re.findall(r'\w+', document['text'].lower())
+        for document in generate_documents(args.docs, args.doc_chars, args.seed)
+    ]
+    latencies, elapsed = timed(
+        lambda tokens: extract_ngrams(tokens, NGRAM_SIZES, NGRAM_MIN_FREQUENCY, NGRAM_TOP_K),
+        token_lists
+    )
+    return summarize(latencies, len(token_lists), elapsed)
+
+
+def bench_queue(transformer, args):
+    import mongomock
+    from src.queue_processing import QueueProcessor
+
+    client = mongomock.MongoClient()
+    documents = generate_documents(args.docs, args.doc_chars, args.seed)
+    client.test.RAW.insert_many(documents)
+    latencies = []
+    with tempfile.TemporaryDirectory() as directory:
+        processor = QueueProcessor(db_file=os.path.join(directory, 'queue.db'), text_transformer=transformer)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            processor.add_documents_to_db([document['_id'] for document in documents])
+            processor.client = client
+            run_start = time.perf_counter()
+            summary = processor.run_queue(workers=1, force=True)
+            latencies.append(time.perf_counter() - run_start)
+            if summary is None or summary['failed']:
+                raise RuntimeError(f"Queue drain did not process every document: {summary}")
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, len(documents) * args.repeat, elapsed)
+
+
+def compare(results, baseline, threshold):
+    """Return a description of every metric that regressed beyond the threshold."""
+    regressions = []
+    for stage, metrics in baseline['stages'].items():
+        current = results['stages'].get(stage)
+        if current is None:
+            continue
+        if 'error' in current:
+            regressions.append(f"{stage}: failed ({current['error']})")
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            before = metrics.get(metric)
+            after = current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (change > threshold) if higher_is_worse else (change < -threshold):
+                regressions.append(f"{stage}.{metric}: {before:.2f} -> {after:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stages', nargs='*', default=STAGES, choices=STAGES)
+    parser.add_argument('--docs', type=int, default=100, help='documents in the generated corpus')
+    parser.add_argument('--doc-chars', type=int, default=5000, help='approximate size of each generated document')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of the book and queue stages')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--save-baseline', help='write the results as the baseline to this JSON file')
+    parser.add_argument('--baseline', help='compare the results with this baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    transformer = TextTransformer()
+    transformer.warm_up()  # keep model and language profile loading out of the timings
+    results = {
+        'parameters': {
+            key: value for key, value in vars(args).items()
+            if key not in ('stages', 'output', 'save_baseline', 'baseline', 'threshold')
+        },
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'model': DEFAULT_MODEL},
+        'stages': {}
+    }
+    benchmarks = {
+        'book': bench_book, 'document': bench_document, 'query': bench_query,
+        'html': bench_html, 'ngrams': bench_ngrams, 'queue': bench_queue
+    }
+    print(f"{'stage':<10}{'calls':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'items/s':>11}{'RSS MB':>9}")
+    failed = []
+    for stage in args.stages:
+        try:
+            metrics = benchmarks[stage](transformer, args)
+        except Exception as e:
+            failed.append(stage)
+            results['stages'][stage] = {'error': f"{type(e).__name__}: {e}"}
+            print(f"{stage:<10}failed: {type(e).__name__}: {e}")
+            continue
+        results['stages'][stage] = metrics
+        print(f"{stage:<10}{metrics['calls']:>7}{metrics['p50_ms']:>10.2f}{metrics['p90_ms']:>10.2f}"
+              f"{metrics['p99_ms']:>10.2f}{metrics['items_per_second']:>11.1f}{metrics['peak_rss_mb']:>9.1f}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('parameters') != results['parameters']:
+            print("Warning: the baseline was recorded with different parameters")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+    if failed:
+        print(f"Failed stages: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,28 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from typing import Dict, Any
 import logging
 import json
 import os
+import sys
+import threading
 from pymongo import MongoClient
-from processor import TextTransformer
+
+# Import the modules as the src package, which they are written for, so the app
+# also starts when run directly as `python src/api.py`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.bulk_writer import BulkWriter
+from src.config import (
+    BATCH_SIZE, OUTPUT_SCHEMA, QUERY_BATCHING, QUERY_PROFILE, QUEUE_CHUNK_SIZE,
+    MONGO_URI, MONGO_TIMEOUT_MS, QUEUE_SNAPSHOT_FILE, QUEUE_JOURNAL_FILE
+)
+from src.jobs import JobManager
+from src.metrics import metrics, DOCUMENTS_TOTAL, QUEUE_DEPTH
+from src.model_registry import loaded_pipelines
+from src.processor import TextTransformer
+from src.query_batcher import QueryBatcher
+from src.query_cache import QueryCache
+from src.queue_processing import fetch_raw_documents, transform_chunk, transform_settings
 
 app = Flask(__name__)
 CORS(app)
@@ -14,61 +31,76 @@ CORS(app)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# MongoDB URI
-MONGO_URI = "mongodb://128.113.126.79:27017"
-client = MongoClient(MONGO_URI)
-db = client.test
-transformed_collection = db.TRANSFORMED
+# MongoDB client, connected on first use so importing the app never touches the network
+client = None
+client_lock = threading.Lock()
+
+def get_db():
+    """Return the MongoDB database, creating the client on first use."""
+    global client
+    if client is None:
+        with client_lock:
+            if client is None:
+                client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
+    return client.test
 
 # Simulated queues and storage for demonstration purposes
 new_document_queue = []
+queued_ids = set()
+queue_loaded = False
+queue_lock = threading.Lock()
 
-# Load queue from file if it exists
-if os.path.exists('queue.json'):
-    with open('queue.json', 'r') as f:
-        new_document_queue = json.load(f)
+def load_queue():
+    """
+    Load the persisted queue, once, on the first request rather than at import.
+    New queue entries are appended to a JSON-lines journal, so enqueueing never
+    rewrites the whole queue; the snapshot file is written by older versions.
+    """
+    global queue_loaded
+    if queue_loaded:
+        return
+    with queue_lock:
+        if queue_loaded:
+            return
+        if os.path.exists(QUEUE_SNAPSHOT_FILE):
+            with open(QUEUE_SNAPSHOT_FILE, 'r') as f:
+                new_document_queue.extend(json.load(f))
+        if os.path.exists(QUEUE_JOURNAL_FILE):
+            with open(QUEUE_JOURNAL_FILE, 'r') as f:
+                new_document_queue.extend(json.loads(line) for line in f if line.strip())
+        queued_ids.update(document['id'] for document in new_document_queue)
+        queue_loaded = True
 
-def save_queue():
-    """Save the current queue to a file."""
-    with open('queue.json', 'w') as f:
-        json.dump(new_document_queue, f)
+# Background model warm-up, reported by /readyz
+warm_up_job = None
+warm_up_lock = threading.Lock()
+
+def start_warm_up():
+    """Start loading the models in the background, unless that is done or under way; returns the job."""
+    global warm_up_job
+    job = warm_up_job
+    if job is not None and job.state != "failed":
+        return job
+    with warm_up_lock:
+        if warm_up_job is None or warm_up_job.state == "failed":
+            warm_up_job, _ = warm_up_manager.start("warm_up", lambda job: text_transformer.warm_up())
+        return warm_up_job
+
+@app.before_request
+def start_up():
+    """Load the queue and start warming up the models when the first request comes in."""
+    load_queue()
+    start_warm_up()
+
+def save_queue(entries):
+    """Append new queue entries to the journal file in a single write."""
+    with open(QUEUE_JOURNAL_FILE, 'a') as f:
+        f.write("".join(json.dumps(entry) + "\n" for entry in entries))
     logger.info(f"Queue saved with {len(new_document_queue)} documents.")
 
-def process_and_add_transformed_document(document_id):
-    """Process a document and store the transformed result."""
-    logger.info(f"Processing document ID: {document_id}")
-    
-    # Retrieve the raw document from the RAW collection
-    raw_document = db.RAW.find_one({"_id": document_id})
-    if not raw_document:
-        logger.error(f"No document found with ID: {document_id}")
-        return
-    
-    logger.info(f"Retrieved raw document: {raw_document}")
-    
-    # Initialize the transformer
-    transformer = TextTransformer()
-    
-    # Process the document
-    processed_result = transformer.process_document(raw_document)
-    logger.info(f"Processed document result: {processed_result}")
-    
-    # Store the transformed document
-    transformed_document = {
-        "url": raw_document.get('url'),
-        "doc_id": document_id,
-        "text": processed_result,
-        "metadata": {"processed": True}
-    }
-    
-    # Insert or update the document in the TRANSFORMED collection
-    existing_doc = transformed_collection.find_one({"url": raw_document.get('url')})
-    if existing_doc:
-        transformed_collection.update_one({"url": raw_document.get('url')}, {"$set": transformed_document})
-        logger.info(f"Updated transformed document with URL: {raw_document.get('url')}")
-    else:
-        transformed_collection.insert_one(transformed_document)
-        logger.info(f"Inserted transformed document with ID: {document_id}")
+def drain_settings(force=False):
+    """Transform settings for this app, shared with the queue so both store the same fingerprint."""
+    return transform_settings(text_transformer, OUTPUT_SCHEMA, force, BATCH_SIZE)
 
 # Endpoint: newDocument()
 @app.route('/newDocument', methods=['POST'])
@@ -79,23 +111,131 @@ def new_document():
         logger.warning("Received request without document_id")
         return jsonify({"error": "document_id is required"}), 400
     
-    new_document_queue.append({"id": document_id})
+    with queue_lock:
+        new_document_queue.append({"id": document_id})
+        queued_ids.add(document_id)
+        save_queue([{"id": document_id}])
     logger.info(f"Added document ID {document_id} to processing queue")
-    save_queue()
     return jsonify({"message": f"Document ID {document_id} added to processing queue"}), 200
 
+@app.route('/newDocuments', methods=['POST'])
+def new_documents():
+    """
+    Add a batch of document IDs to the processing queue.
+    Input: JSON with "document_ids" (list of IDs).
+    Output: Per-ID status ("accepted" or "duplicate") and totals.
+    """
+    data = request.json
+    document_ids = data.get("document_ids")
+    if not isinstance(document_ids, list) or not document_ids or not all(document_ids):
+        logger.warning("Received bulk request without valid document_ids")
+        return jsonify({"error": "document_ids must be a non-empty list of IDs"}), 400
+
+    results = []
+    with queue_lock:
+        entries = []
+        for document_id in document_ids:
+            if document_id in queued_ids:
+                results.append({"document_id": document_id, "status": "duplicate"})
+            else:
+                queued_ids.add(document_id)
+                entries.append({"id": document_id})
+                results.append({"document_id": document_id, "status": "accepted"})
+        new_document_queue.extend(entries)
+        if entries:
+            save_queue(entries)
+
+    accepted = len(entries)
+    logger.info(f"Added {accepted} of {len(document_ids)} document IDs to processing queue")
+    return jsonify({
+        "results": results,
+        "accepted": accepted,
+        "duplicate": len(document_ids) - accepted
+    }), 200
+
+def drain_queue(job, force=False):
+    """
+    Process every document in the queue, reporting progress on the job.
+    Documents whose stored transformed version has the same content hash and
+    pipeline fingerprint are skipped unless force is set. Transformed documents
+    count as processed once MongoDB acknowledges their bulk write, and as failed
+    if it does not.
+    """
+    with queue_lock:
+        document_ids = [document['id'] for document in new_document_queue]
+    job.total = len(document_ids)
+
+    def acknowledged(acknowledged_ids):
+        job.processed += len(acknowledged_ids)
+        metrics.increment(DOCUMENTS_TOTAL, len(acknowledged_ids), outcome="processed")
+
+    db = get_db()
+    settings = drain_settings(force)
+    transformed = 0
+    try:
+        # Chunks go through the same transform as the SQLite queue (src/queue_processing.py)
+        with BulkWriter(db.TRANSFORMED, key="doc_id", on_flush=acknowledged) as writer:
+            chunk_size = max(QUEUE_CHUNK_SIZE, BATCH_SIZE)  # each chunk fills an nlp.pipe batch
+            for start in range(0, len(document_ids), chunk_size):
+                chunk = document_ids[start:start + chunk_size]
+                raw_documents = fetch_raw_documents(db.RAW, chunk)
+                for document_id, status, payload in transform_chunk(
+                    text_transformer, db.TRANSFORMED, chunk, raw_documents, settings
+                ):
+                    if status == "processed":
+                        writer.add(payload)
+                        transformed += 1
+                    elif status == "skipped":
+                        job.skipped += 1
+                        metrics.increment(DOCUMENTS_TOTAL, outcome="skipped")
+                    else:
+                        job.failed += 1
+                        metrics.increment(DOCUMENTS_TOTAL, outcome="failed")
+                        logger.warning(f"Failed to process document ID {document_id}: {payload}")
+                writer.flush_if_due()
+    finally:
+        # Transformed documents whose bulk write was not acknowledged also failed
+        unacknowledged = transformed - job.processed
+        if unacknowledged:
+            job.failed += unacknowledged
+            metrics.increment(DOCUMENTS_TOTAL, unacknowledged, outcome="failed")
+            logger.warning(f"{unacknowledged} transformed documents were not written")
+
 @app.route('/processQueue', methods=['POST'])
 def process_queue():
-    """Process all documents in the queue."""
-    for document in new_document_queue:
-        process_and_add_transformed_document(document['id'])
-    return jsonify({"message": "All documents processed"}), 200
+    """
+    Start processing all documents in the queue in the background.
+    Input: optional JSON with "force" to reprocess unchanged documents.
+    Output: The job ID to poll at /processQueue/<job_id>. While a drain is
+    running, further requests return that drain's job instead of starting another.
+    """
+    force = bool((request.get_json(silent=True) or {}).get('force', False))
+    job, created = job_manager.start("processQueue", lambda job: drain_queue(job, force))
+    if created:
+        logger.info(f"Started queue drain job {job.id}")
+    else:
+        logger.info(f"Queue drain job {job.id} is already running")
+    return jsonify({
+        "job_id": job.id,
+        "status": job.state,
+        "coalesced": not created,
+        "status_url": f"/processQueue/{job.id}"
+    }), 202
+
+@app.route('/processQueue/<job_id>', methods=['GET'])
+def process_queue_status(job_id):
+    """Report the progress of a queue drain job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job ID {job_id}"}), 404
+    return jsonify(job.status()), 200
 
 @app.route('/transformQuery', methods=['POST'])
 def transform_query():
     """
     Transform search query for the Querying team.
-    Input: JSON with "query".
+    Input: JSON with "query" and optionally "fields", the result fields to
+    compute (e.g. ["tokens", "bigrams"]); by default all of them.
     Output: Transformed query in JSON format.
     """
     try:
@@ -103,7 +243,15 @@ def transform_query():
         query = data.get('query')
         if not query:
             return jsonify({"error": "Missing query"}), 400
-        transformed_query = text_transformer.process_query(query)
+        fields = data.get('fields')
+        if fields is not None:
+            if not isinstance(fields, list):
+                return jsonify({"error": "fields must be a list of field names"}), 400
+            try:
+                text_transformer.resolve_fields(QUERY_PROFILE, fields)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        transformed_query = query_cache.process_query(query_processor, query, fields=fields)
         logger.info(f"Query: {query}")
         logger.info(f"Transformed query: {transformed_query}")
         return jsonify(transformed_query), 200
@@ -112,7 +260,46 @@ def transform_query():
         logger.error(f"Error transforming query: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/healthz', methods=['GET'])
+def liveness():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readiness():
+    """Readiness: 200 once the models are warm, 503 while they load or if loading failed."""
+    job = start_warm_up()
+    ready = job.state == "succeeded"
+    return jsonify({
+        "ready": ready,
+        "warm_up": job.state,
+        "error": job.error,
+        "models": [list(key) for key in loaded_pipelines()]
+    }), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose stage timings, document counters, Mongo latency and cache stats to Prometheus."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/queryCacheStats', methods=['GET'])
+def query_cache_stats():
+    """Report hit/miss/eviction counters of the /transformQuery cache."""
+    return jsonify(query_cache.stats()), 200
+
+# Every request shares one transformer; its models load in the background on the
+# first request (see start_warm_up), so importing the app stays fast
 text_transformer = TextTransformer()
+query_cache = QueryCache()
+job_manager = JobManager()
+# Warm-up has its own worker, so a retried warm-up never waits behind a queue drain
+warm_up_manager = JobManager(max_workers=1)
+query_cache.register_metrics()
+metrics.register_gauge(QUEUE_DEPTH, lambda: len(new_document_queue))
+# Concurrent queries share spaCy passes when batching is enabled
+query_processor = QueryBatcher(text_transformer) if QUERY_BATCHING else text_transformer
 
 if __name__ == '__main__':
+    load_queue()
+    start_warm_up()
     app.run(host='0.0.0.0', port=5001)
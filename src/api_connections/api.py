@@ -1,26 +1,72 @@
 import logging
+import threading
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
 from typing import Dict, Any
 
+from ..config import QUERY_BATCHING, QUERY_PROFILE
+from ..jobs import JobManager
+from ..metrics import metrics, QUEUE_DEPTH
+from ..model_registry import loaded_pipelines
 from ..processor import TextTransformer
 from ..queue_processing import QueueProcessor
+from ..query_batcher import QueryBatcher
+from ..query_cache import QueryCache
 
 # Initialize Flask app and enable CORS
 app = Flask(__name__)
 CORS(app)
 
-# Initialize TextTransformer
+# One transformer for the whole process; its models load in the background on the
+# first request (see start_warm_up), so importing the app stays fast
 text_transformer = TextTransformer()
-queue_processor = QueueProcessor()
+query_cache = QueryCache()
+job_manager = JobManager()
+query_cache.register_metrics()
+# Concurrent queries share spaCy passes when batching is enabled
+query_processor = QueryBatcher(text_transformer) if QUERY_BATCHING else text_transformer
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# The queue database is opened on first use rather than at import
+_queue_processor = None
+_startup_lock = threading.Lock()
+
+def get_queue_processor():
+    """Return the shared QueueProcessor, creating it on first use."""
+    global _queue_processor
+    if _queue_processor is None:
+        with _startup_lock:
+            if _queue_processor is None:
+                _queue_processor = QueueProcessor(text_transformer=text_transformer)
+    return _queue_processor
+
+metrics.register_gauge(QUEUE_DEPTH, lambda: get_queue_processor().queue_depth())
+
+# Background model warm-up, reported by /readyz
+_warm_up_job = None
+
+def start_warm_up():
+    """Start loading the models in the background, unless that is done or under way; returns the job."""
+    global _warm_up_job
+    job = _warm_up_job
+    if job is not None and job.state != "failed":
+        return job
+    with _startup_lock:
+        if _warm_up_job is None or _warm_up_job.state == "failed":
+            _warm_up_job, _ = job_manager.start("warm_up", lambda job: text_transformer.warm_up())
+        return _warm_up_job
+
+@app.before_request
+def start_up():
+    """Start warming up the models when the first request comes in."""
+    start_warm_up()
+
 # Endpoint: newDocument()
 @app.route('/newDocument', methods=['POST'])
 def new_document():
@@ -35,18 +81,44 @@ def new_document():
         logger.warning("Received request without document_id")
         return jsonify({"error": "document_id is required"}), 400
 
-    if queue_processor.add_document_to_db(document_id):
+    if get_queue_processor().add_document_to_db(document_id):
         logger.info(f"Added document ID {document_id} to the queue")
         return jsonify({"message": f"Document ID {document_id} added to the queue"}), 200
     else:
         return jsonify({"error": f"Document ID {document_id} already exists in queue. Waiting to be processed."}), 400
+
+@app.route('/newDocuments', methods=['POST'])
+def new_documents():
+    """
+    Adds a batch of document IDs to the processing queue in one transaction.
+    Input: JSON with document_ids (list of IDs).
+    Output: Per-ID status ("accepted" or "duplicate") and totals.
+    """
+    data = request.json
+    document_ids = data.get("document_ids")
+    if not isinstance(document_ids, list) or not document_ids or not all(document_ids):
+        logger.warning("Received bulk request without valid document_ids")
+        return jsonify({"error": "document_ids must be a non-empty list of IDs"}), 400
+
+    results = get_queue_processor().add_documents_to_db(document_ids)
+    if any(result["status"] == "error" for result in results):
+        return jsonify({"error": "Failed to add document IDs to the queue"}), 500
+
+    accepted = sum(1 for result in results if result["status"] == "accepted")
+    logger.info(f"Added {accepted} of {len(document_ids)} document IDs to the queue")
+    return jsonify({
+        "results": results,
+        "accepted": accepted,
+        "duplicate": len(document_ids) - accepted
+    }), 200
     
 
 @app.route('/transformQuery', methods=['POST'])
 def transform_query():
     """
     Transform search query for the Querying team.
-    Input: JSON with "query".
+    Input: JSON with "query" and optionally "fields", the result fields to
+    compute (e.g. ["tokens", "bigrams"]); by default all of them.
     Output: Transformed query in JSON format.
     """
     try:
@@ -54,7 +126,15 @@ def transform_query():
         query = data.get('query')
         if not query:
             return jsonify({"error": "Missing query"}), 400
-        transformed_query = text_transformer.process_query(query)
+        fields = data.get('fields')
+        if fields is not None:
+            if not isinstance(fields, list):
+                return jsonify({"error": "fields must be a list of field names"}), 400
+            try:
+                text_transformer.resolve_fields(QUERY_PROFILE, fields)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        transformed_query = query_cache.process_query(query_processor, query, fields=fields)
         logger.info(f"Query: {query}")
         logger.info(f"Transformed query: {transformed_query}")
         return jsonify(transformed_query), 200
@@ -62,5 +142,34 @@ def transform_query():
     except Exception as e:
         logger.error(f"Error transforming query: {str(e)}")
         return jsonify({"error": str(e)}), 500
+
+@app.route('/healthz', methods=['GET'])
+def liveness():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readiness():
+    """Readiness: 200 once the models are warm, 503 while they load or if loading failed."""
+    job = start_warm_up()
+    ready = job.state == "succeeded"
+    return jsonify({
+        "ready": ready,
+        "warm_up": job.state,
+        "error": job.error,
+        "models": [list(key) for key in loaded_pipelines()]
+    }), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose stage timings, document counters, Mongo latency and cache stats to Prometheus."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/queryCacheStats', methods=['GET'])
+def query_cache_stats():
+    """Report hit/miss/eviction counters of the /transformQuery cache."""
+    return jsonify(query_cache.stats()), 200
+
 if __name__ == '__main__':
+    start_warm_up()
     app.run(host='0.0.0.0', port=5001)
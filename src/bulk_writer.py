@@ -0,0 +1,103 @@
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import bson
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .config import BULK_WRITE_MAX_DOCUMENTS, BULK_WRITE_MAX_BYTES, BULK_WRITE_MAX_INTERVAL
+from .metrics import metrics, MONGO_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriter:
+    """
+    Write-behind buffer that upserts documents into a MongoDB collection with bulk_write.
+
+    Documents are buffered and flushed as one unordered bulk of upserts, keyed on
+    `key`, once the buffer reaches max_documents or max_bytes (BSON size), or when
+    max_interval seconds have passed since the oldest buffered document. After
+    each flush, on_flush is called with the keys MongoDB acknowledged, so callers
+    can release work (e.g. queue entries) only for documents that were written.
+    """
+
+    def __init__(self, collection, key: str = "doc_id",
+                 max_documents: int = BULK_WRITE_MAX_DOCUMENTS,
+                 max_bytes: int = BULK_WRITE_MAX_BYTES,
+                 max_interval: float = BULK_WRITE_MAX_INTERVAL,
+                 on_flush: Optional[Callable[[List[Any]], None]] = None,
+                 clock=time.monotonic):
+        self.collection = collection
+        self.key = key
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.on_flush = on_flush
+        self._clock = clock
+        self._buffer: List[Dict[str, Any]] = []
+        self._bytes = 0
+        self._first_buffered_at = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, document: Dict[str, Any]) -> List[Any]:
+        """Buffer a document; returns the acknowledged keys if this triggered a flush."""
+        if not self._buffer:
+            self._first_buffered_at = self._clock()
+        self._buffer.append(document)
+        self._bytes += len(bson.encode(document))
+        if (len(self._buffer) >= self.max_documents
+                or self._bytes >= self.max_bytes
+                or self._clock() - self._first_buffered_at >= self.max_interval):
+            return self.flush()
+        return []
+
+    def flush_if_due(self) -> List[Any]:
+        """
+        Flush if the oldest buffered document has waited longer than max_interval.
+        Drain loops call this between batches, as add() only checks the interval
+        when a document comes in.
+        """
+        if self._buffer and self._clock() - self._first_buffered_at >= self.max_interval:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[Any]:
+        """
+        Upsert every buffered document in one bulk_write and return the acknowledged keys.
+        Documents that failed are logged and dropped from the buffer.
+        """
+        if not self._buffer:
+            return []
+        documents = self._buffer
+        self._buffer = []
+        self._bytes = 0
+        self._first_buffered_at = None
+
+        operations = [
+            UpdateOne({self.key: document[self.key]}, {"$set": document}, upsert=True)
+            for document in documents
+        ]
+        failed = set()
+        try:
+            with metrics.timer(MONGO_SECONDS, operation="write"):
+                self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                logger.error(f"Error writing document {documents[error['index']][self.key]}: {error.get('errmsg')}")
+        except Exception as e:
+            logger.error(f"Bulk write of {len(documents)} documents failed: {e}")
+            return []
+
+        acknowledged = [document[self.key] for i, document in enumerate(documents) if i not in failed]
+        logger.info(f"Bulk wrote {len(acknowledged)} of {len(documents)} documents")
+        if self.on_flush and acknowledged:
+            self.on_flush(acknowledged)
+        return acknowledged
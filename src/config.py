@@ -1,11 +1,156 @@
+import os
+
+# Service settings, overridable from the environment. Nothing connects or loads at
+# import time: MongoDB is connected on first use, and a connection attempt gives up
+# after MONGO_TIMEOUT_MS instead of blocking a request indefinitely.
+MONGO_URI = os.environ.get("TEXT_TRANSFORMER_MONGO_URI", "mongodb://128.113.126.79:27017")
+MONGO_TIMEOUT_MS = int(os.environ.get("TEXT_TRANSFORMER_MONGO_TIMEOUT_MS", "5000"))
+QUEUE_DB_FILE = os.environ.get("TEXT_TRANSFORMER_QUEUE_DB", "doc_id_queue.db")  # QueueProcessor
+# The Flask app's queue: queue.json is the snapshot written by older versions, new
+# entries are appended to the JSON-lines journal
+QUEUE_SNAPSHOT_FILE = os.environ.get("TEXT_TRANSFORMER_QUEUE_SNAPSHOT", "queue.json")
+QUEUE_JOURNAL_FILE = os.environ.get("TEXT_TRANSFORMER_QUEUE_JOURNAL", "queue.jsonl")
+
 # spaCy model configuration
-DEFAULT_MODEL = "en_core_web_sm"
+DEFAULT_MODEL = os.environ.get("TEXT_TRANSFORMER_MODEL", "en_core_web_sm")
+
+# Bump whenever a code change alters processed output, so stored documents are
+# reprocessed. Settings below that shape the output (profiles, chunking, HTML, PDF,
+# language detection and n-grams; see queue_processing.output_settings) are part
+# of the pipeline fingerprint already and need no bump.
+PIPELINE_VERSION = "5"
+
+# Pipeline profiles. "exclude" components are never loaded, "disable" components are
+# loaded but not run, and "fields" lists the result fields the profile computes.
+# "detect_language" runs language identification and records "language" in the result.
+# The lemmatizer relies on the tagger, so every profile keeps it.
+PIPELINE_PROFILES = {
+    "full": {
+        "exclude": [],
+        "disable": [],
+        "fields": ["tokens", "bigrams", "trigrams", "named_entities", "parts_of_speech"],
+        "detect_language": True
+    },
+    "index": {
+        "exclude": ["parser", "ner"],
+        "disable": [],
+        "fields": ["tokens", "bigrams", "trigrams", "parts_of_speech"],
+        "detect_language": True
+    },
+    "query": {
+        "exclude": ["parser", "ner"],
+        "disable": [],
+        "fields": ["tokens", "bigrams", "trigrams"],
+        "detect_language": False
+    }
+}
+# Pipeline components only some result fields need: a call that requests none of
+# those fields (e.g. a query asking for ["tokens", "bigrams"]) runs without them
+FIELD_COMPONENTS = {
+    "named_entities": ["ner"]
+}
+DEFAULT_PROFILE = "full"  # used by process_document / process_documents
+QUERY_PROFILE = "full"  # used by process_query
+
+# Documents are routed to a model by their detected language; languages without a
+# model here (or undetected ones) use the transformer's own model. Models load lazily,
+# and loading one beyond MAX_RESIDENT_MODELS evicts the least recently used.
+# The models and their versions are part of TextTransformer.fingerprint.
+LANGUAGE_MODELS = {
+    'en': 'en_core_web_sm',
+    'es': 'es_core_news_sm',
+    'fr': 'fr_core_news_sm',
+    'de': 'de_core_news_sm'
+}
+MAX_RESIDENT_MODELS = 2
+
+# Batched processing (TextTransformer.process_documents / nlp.pipe). N_PROCESS is
+# spaCy's own process pool per call; queue drains always pass 1 and use worker
+# processes instead (QUEUE_WORKERS), since a pool would start for every chunk
+BATCH_SIZE = 64
+N_PROCESS = 1
+LANGUAGE_GROUP_WINDOW = 256  # documents read ahead to group into same-language batches
+
+# Documents longer than CHUNK_THRESHOLD characters are streamed through spaCy in
+# chunks of at most CHUNK_SIZE characters (spaCy's own limit is nlp.max_length, 1M)
+CHUNK_THRESHOLD = 200000
+CHUNK_SIZE = 100000
+
+# HTML cleaning (src/html_cleaning.py): "parser" (streaming, stdlib), "lxml" (needs lxml)
+# or "bs4" (the original BeautifulSoup cleaner, which keeps boilerplate tags).
+HTML_CLEANER = "parser"
+HTML_STRIP_TAGS = ['script', 'style', 'noscript', 'template', 'svg', 'iframe', 'nav', 'aside', 'footer']
+HTML_MAX_CHARS = 5 * 1024 * 1024  # longer pages are cut before parsing
+
+# PDF extraction (src/pdf_extraction.py): pages with less text than PDF_OCR_MIN_CHARS
+# are OCR'd, one rendered page at a time, across PDF_OCR_WORKERS processes
+PDF_MAX_PAGES = 500
+PDF_TIME_BUDGET = 300  # seconds per document; pages not extracted by then stay empty
+PDF_OCR_WORKERS = 4
+PDF_OCR_DPI = 200
+PDF_OCR_MIN_CHARS = 10
+
+# Queue draining (QueueProcessor.run_queue); more than one worker enables the process pool
+QUEUE_WORKERS = 1
+QUEUE_CHUNK_SIZE = 64  # at least BATCH_SIZE: each chunk is one process_documents call
+QUEUE_PREFETCH_WINDOW = 2  # chunks of RAW documents fetched ahead of the NLP work
+QUEUE_LEASE_SECONDS = 600  # claimed entries become claimable again after this long
+QUEUE_BUSY_TIMEOUT = 30  # seconds to wait for another consumer's SQLite lock
+
+# Schema of the "text" field of TRANSFORMED documents: "expanded" (one entry per
+# occurrence) or "compact" (versioned postings, see src/schema.py)
+OUTPUT_SCHEMA = "expanded"
+
+# Background jobs (JobManager), e.g. the asynchronous /processQueue drain
+JOB_WORKERS = 1
+JOB_HISTORY = 100  # finished jobs kept for status lookups
+
+# Bulk upserts of transformed documents (BulkWriter); a flush happens when any limit is hit
+BULK_WRITE_MAX_DOCUMENTS = 500
+BULK_WRITE_MAX_BYTES = 8 * 1024 * 1024
+BULK_WRITE_MAX_INTERVAL = 5  # seconds
+
+# /transformQuery result cache (QueryCache); a max of 0 entries disables it
+QUERY_CACHE_MAX_ENTRIES = 10000
+QUERY_CACHE_TTL = 300  # seconds
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Micro-batching of concurrent /transformQuery requests (QueryBatcher); opt-in. A query
+# waits up to QUERY_BATCH_MAX_WAIT seconds for other queries to share its batch, plus
+# the time of a batch already running.
+QUERY_BATCHING = False
+QUERY_BATCH_MAX_SIZE = 32
+QUERY_BATCH_MAX_WAIT = 0.005  # seconds
+
+# Language detection (src/language.py) runs on a sample of at most LANGUAGE_SAMPLE_SIZE
+# characters taken from LANGUAGE_SAMPLE_WINDOWS spots in the text, with a fixed seed
+LANGUAGE_SAMPLE_SIZE = 2000
+LANGUAGE_SAMPLE_WINDOWS = 3
+LANGUAGE_MIN_LENGTH = 20
+LANGUAGE_SEED = 0
 
 # Supported languages
-SUPPORTED_LANGUAGES = ['en', 'es', 'fr', 'de']
+SUPPORTED_LANGUAGES = list(LANGUAGE_MODELS)
 
-# N-gram configuration
+# N-gram configuration (src/utils.py). Each order is stored in the field named by
+# utils.ngram_field ("bigrams", "trigrams", "4grams", ...) if the profile lists it.
+# Documents keep the NGRAM_TOP_K most frequent n-grams per order (0 keeps all) that
+# occur at least NGRAM_MIN_FREQUENCY times; queries keep all of theirs.
 NGRAM_SIZES = [2, 3]  # bi-grams and tri-grams
+NGRAM_MIN_FREQUENCY = 1
+NGRAM_TOP_K = 10000
+NGRAM_HASH_IDS = False  # add a stable 64-bit "id" to each n-gram entry
+
+# Sampling profiler (src/profiling.py), off unless PROFILE_SAMPLE_RATE > 0. That share of
+# process_document / process_query(ies) calls and queue chunks runs under cProfile (and
+# tracemalloc with PROFILE_TRACE_MEMORY), dumped to PROFILE_DIR, which keeps the newest
+# PROFILE_MAX_FILES profiles. Set from the environment to profile a deployment in place;
+# aggregate the dumps with `python -m src.profiling PROFILE_DIR`.
+PROFILE_SAMPLE_RATE = float(os.environ.get("TEXT_TRANSFORMER_PROFILE_RATE", "0"))
+PROFILE_DIR = os.environ.get("TEXT_TRANSFORMER_PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("TEXT_TRANSFORMER_PROFILE_MAX_FILES", "200"))
+PROFILE_TRACE_MEMORY = os.environ.get("TEXT_TRANSFORMER_PROFILE_MEMORY", "").lower() in ("1", "true", "yes")
+PROFILE_MEMORY_TOP = 25  # allocation sites recorded per traced profile
 
 # Entity types to extract
 ENTITY_TYPES = [
@@ -0,0 +1,138 @@
+import logging
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import HTML_CLEANER, HTML_STRIP_TAGS, HTML_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+
+# Elements that never have content or an end tag
+_VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'
+])
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Streaming HTML-to-text extractor: collects stripped text runs and drops
+    everything inside the strip tags, without building a tree.
+
+    Open elements are tracked on a stack. The text of a strip element is held
+    back and dropped when its own end tag arrives. A strip element that is never
+    closed (closed implicitly by an enclosing element's end tag, or open at the
+    end of the page) is treated as a stray tag and its text is kept, as the bs4
+    backend does, so malformed crawled pages do not lose the rest of their text.
+    """
+
+    def __init__(self, strip_tags: Iterable[str]):
+        super().__init__(convert_charrefs=True)
+        self.strip_tags = frozenset(strip_tags)
+        self.parts: List[str] = []
+        self._open: List[str] = []  # open element tags, outermost first
+        self._positions: Dict[str, List[int]] = {}  # tag -> its indexes in _open
+        self._held: List[Tuple[int, List[str]]] = []  # (index in _open, text) of open strip elements
+
+    def _sink(self) -> List[str]:
+        """Where text goes: the innermost open strip element, else the output."""
+        return self._held[-1][1] if self._held else self.parts
+
+    def _pop(self) -> Optional[List[str]]:
+        """Close the innermost open element; returns its held text if it is a strip element."""
+        tag = self._open.pop()
+        self._positions[tag].pop()
+        if self._held and self._held[-1][0] == len(self._open):
+            return self._held.pop()[1]
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            return
+        if tag in self.strip_tags:
+            self._held.append((len(self._open), []))
+        self._positions.setdefault(tag, []).append(len(self._open))
+        self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags (<svg/>, <br/>) have no content to skip
+        pass
+
+    def handle_endtag(self, tag):
+        positions = self._positions.get(tag)
+        if not positions:
+            return  # an end tag without a matching start tag is ignored
+        index = positions[-1]
+        # Elements left open inside this one close implicitly; strip elements among them keep their text
+        while len(self._open) > index + 1:
+            held = self._pop()
+            if held:
+                self._sink().extend(held)
+        self._pop()  # a strip element's own end tag drops its text
+
+    def handle_data(self, data):
+        data = data.strip()
+        if data:
+            self._sink().append(data)
+
+    def close(self):
+        super().close()
+        while self._open:
+            held = self._pop()
+            if held:
+                self._sink().extend(held)
+
+
+def _clean_with_parser(html_content: str, strip_tags: Iterable[str]) -> str:
+    extractor = _TextExtractor(strip_tags)
+    extractor.feed(html_content)
+    extractor.close()
+    return " ".join(extractor.parts)
+
+
+def _clean_with_lxml(html_content: str, strip_tags: Iterable[str]) -> str:
+    from lxml import etree, html as lxml_html
+
+    tree = lxml_html.fromstring(html_content)
+    etree.strip_elements(tree, etree.Comment, *strip_tags, with_tail=False)
+    return " ".join(text.strip() for text in tree.itertext() if text.strip())
+
+
+def _clean_with_bs4(html_content: str, strip_tags: Iterable[str]) -> str:
+    # The original cleaner; strip_tags is ignored so its output stays the same
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    return soup.get_text(separator=' ', strip=True)
+
+
+BACKENDS: Dict[str, Callable[[str, Iterable[str]], str]] = {
+    "parser": _clean_with_parser,
+    "lxml": _clean_with_lxml,
+    "bs4": _clean_with_bs4
+}
+
+
+def clean_html(html_content: str, backend: str = HTML_CLEANER,
+               strip_tags: Iterable[str] = HTML_STRIP_TAGS, max_chars: int = HTML_MAX_CHARS) -> str:
+    """
+    Extract the visible text of an HTML document, dropping the content of
+    strip_tags (scripts, styles, navigation and similar boilerplate).
+
+    Pages longer than max_chars are cut to that length before parsing, so very
+    large pages cost bounded time and memory. An unknown backend raises
+    ValueError; the lxml backend falls back to "parser" when lxml is not installed.
+    """
+    try:
+        clean = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown HTML cleaning backend: {backend}")
+
+    if max_chars and len(html_content) > max_chars:
+        logger.warning(f"HTML content of {len(html_content)} characters cut to {max_chars}")
+        html_content = html_content[:max_chars]
+
+    try:
+        return clean(html_content, strip_tags)
+    except ImportError:
+        logger.warning(f"HTML cleaning backend {backend} is unavailable, using the parser backend")
+        return _clean_with_parser(html_content, strip_tags)
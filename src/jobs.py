@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import JOB_WORKERS, JOB_HISTORY
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    A background job and its progress. The job's target updates total and the
+    processed/skipped/failed counters as it goes; status() reports them.
+    """
+
+    def __init__(self, name: str, clock=time.time):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.state = "queued"
+        self.error = None
+        self.total = None
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self._clock = clock
+        self.created_at = clock()
+        self.started_at = None
+        self.finished_at = None
+        self._future = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in ("queued", "running")
+
+    def status(self) -> Dict[str, Any]:
+        """Return the job's state, counters, remaining documents and throughput."""
+        done = self.processed + self.skipped + self.failed
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or self._clock()) - self.started_at
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "status": self.state,
+            "error": self.error,
+            "total": self.total,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "remaining": None if self.total is None else max(self.total - done, 0),
+            "docs_per_second": done / elapsed if elapsed else 0.0,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    """
+    Runs jobs on a background executor and keeps the most recent max_history of
+    them for status lookups. At most one job per name is active: starting a job
+    while one of the same name is queued or running returns the running job
+    instead, so concurrent requests coalesce into a single run.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, max_history: int = JOB_HISTORY, clock=time.time):
+        self.max_history = max_history
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def start(self, name: str, target: Callable[[Job], Any]) -> Tuple[Job, bool]:
+        """
+        Start target(job) in the background, unless a job with this name is
+        still active. Returns the job and whether it was newly created.
+        """
+        with self._lock:
+            job = self._active.get(name)
+            if job is not None:
+                return job, False
+            job = Job(name, clock=self._clock)
+            self._active[name] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_history:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.active:
+                    break
+                del self._jobs[oldest.id]
+        job._future = self._executor.submit(self._run, job, target)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by ID; None if it is unknown or no longer kept."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: Job, timeout: Optional[float] = None) -> Job:
+        """Block until a job has finished, or timeout seconds have passed."""
+        job._future.result(timeout)
+        return job
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: Job, target: Callable[[Job], Any]) -> None:
+        job.state = "running"
+        job.started_at = self._clock()
+        try:
+            target(job)
+            job.state = "succeeded"
+        except Exception as e:
+            logger.error(f"Job {job.name} ({job.id}) failed: {e}")
+            job.state = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = self._clock()
+            with self._lock:
+                self._active.pop(job.name, None)
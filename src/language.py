@@ -0,0 +1,71 @@
+import logging
+import threading
+from typing import Optional
+
+from langdetect import DetectorFactory, LangDetectException, PROFILES_DIRECTORY
+
+from .config import LANGUAGE_SAMPLE_SIZE, LANGUAGE_SAMPLE_WINDOWS, LANGUAGE_MIN_LENGTH, LANGUAGE_SEED
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_LANGUAGE = "unknown"
+
+# One detector factory per process; loading the language profiles is the expensive part
+_factory: Optional[DetectorFactory] = None
+_lock = threading.Lock()
+
+
+def _get_factory() -> DetectorFactory:
+    """Return the shared, seeded detector factory, loading the profiles on first use."""
+    global _factory
+    if _factory is None:
+        with _lock:
+            if _factory is None:
+                factory = DetectorFactory()
+                factory.load_profile(PROFILES_DIRECTORY)
+                factory.set_seed(LANGUAGE_SEED)
+                _factory = factory
+    return _factory
+
+
+def load_profiles() -> None:
+    """Load the language profiles ahead of the first detection."""
+    _get_factory()
+
+
+def sample_text(content: str, size: int = LANGUAGE_SAMPLE_SIZE, windows: int = LANGUAGE_SAMPLE_WINDOWS) -> str:
+    """
+    Take at most size characters from evenly spaced windows of the content, so
+    a boilerplate header or footer does not decide the language on its own.
+    Windows are cut at whitespace where possible.
+    """
+    if len(content) <= size:
+        return content
+    window = size // windows
+    step = (len(content) - window) // max(windows - 1, 1)
+    parts = []
+    for i in range(windows):
+        start = i * step
+        part = content[start:start + window]
+        if start and " " in part:
+            part = part[part.index(" ") + 1:]
+        parts.append(part)
+    return " ".join(parts)
+
+
+def detect_language(content: str, doc_id: Optional[str] = None) -> str:
+    """
+    Detect the language of a text from a bounded sample of it. Results are
+    deterministic; texts that are too short or undetectable give "unknown".
+    """
+    if len(content.strip()) < LANGUAGE_MIN_LENGTH:
+        logger.warning(f"Content too short for language detection: {content}")
+        return UNKNOWN_LANGUAGE
+
+    try:
+        detector = _get_factory().create()
+        detector.append(sample_text(content))
+        return detector.detect()
+    except LangDetectException:
+        logger.error(f"Language detection failed for document ID: {doc_id}")
+        return UNKNOWN_LANGUAGE
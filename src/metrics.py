@@ -0,0 +1,166 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+# Metric names, with their Prometheus type and help text
+STAGE_SECONDS = "text_transformer_stage_seconds"
+DOCUMENTS_TOTAL = "text_transformer_documents_total"
+MONGO_SECONDS = "text_transformer_mongo_seconds"
+QUEUE_DEPTH = "text_transformer_queue_depth"
+QUERY_CACHE_HITS = "text_transformer_query_cache_hits_total"
+QUERY_CACHE_MISSES = "text_transformer_query_cache_misses_total"
+QUERY_CACHE_HIT_RATE = "text_transformer_query_cache_hit_rate"
+
+DESCRIPTIONS = {
+    STAGE_SECONDS: ("summary", "Time spent in each processing stage"),
+    DOCUMENTS_TOTAL: ("counter", "Documents handled, by outcome"),
+    MONGO_SECONDS: ("summary", "Latency of MongoDB reads and writes"),
+    QUEUE_DEPTH: ("gauge", "Document IDs waiting in the queue"),
+    QUERY_CACHE_HITS: ("counter", "Query cache hits"),
+    QUERY_CACHE_MISSES: ("counter", "Query cache misses"),
+    QUERY_CACHE_HIT_RATE: ("gauge", "Share of query cache lookups that were hits")
+}
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class Metrics:
+    """
+    In-process counters, timers and gauges, rendered in the Prometheus text format.
+
+    Timers are summaries: a count and a sum of seconds per label set. Gauges are
+    callbacks evaluated when the metrics are rendered, so values like the queue
+    depth cost nothing between scrapes. Snapshots are plain dicts that can be
+    pickled, subtracted and merged, so worker processes can hand theirs back.
+    """
+
+    def __init__(self):
+        self._counters: Dict[Key, float] = {}
+        self._timers: Dict[Key, List[float]] = {}
+        self._gauges: Dict[Key, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                self._timers[key] = [1, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time the body of a with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register_gauge(self, name: str, callback: Callable[[], float], **labels) -> None:
+        """Report callback() as the gauge's value whenever the metrics are rendered."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = callback
+
+    def snapshot(self) -> Dict[str, Dict[Key, Any]]:
+        """Copy of the counters and timers."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timers": {key: list(timer) for key, timer in self._timers.items()}
+            }
+
+    def merge(self, snapshot: Dict[str, Dict[Key, Any]]) -> None:
+        """Add the counters and timers of a snapshot, e.g. one from a worker process."""
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, (count, seconds) in snapshot["timers"].items():
+                timer = self._timers.setdefault(key, [0, 0.0])
+                timer[0] += count
+                timer[1] += seconds
+
+    def reset(self) -> None:
+        """Drop all counters and timers; registered gauges are kept."""
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            timers = {key: list(timer) for key, timer in self._timers.items()}
+            gauges = dict(self._gauges)
+
+        samples: Dict[str, List[str]] = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), (count, seconds) in timers.items():
+            samples.setdefault(name, []).append(f"{name}_count{_labels(labels)} {count}")
+            samples.setdefault(name, []).append(f"{name}_sum{_labels(labels)} {seconds}")
+        for (name, labels), callback in gauges.items():
+            try:
+                value = callback()
+            except Exception:
+                continue
+            samples.setdefault(name, []).append(f"{name}{_labels(labels)} {value}")
+
+        lines = []
+        for name in sorted(samples):
+            metric_type, help_text = DESCRIPTIONS.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(sorted(samples[name]))
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (label, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for label, value in labels
+    )
+    return "{" + ",".join(f'{label}="{value}"' for label, value in escaped) + "}"
+
+
+def difference(after: Dict[str, Dict[Key, Any]], before: Dict[str, Dict[Key, Any]]) -> Dict[str, Dict[Key, Any]]:
+    """What was added between two snapshots."""
+    counters = {
+        key: value - before["counters"].get(key, 0)
+        for key, value in after["counters"].items()
+        if value != before["counters"].get(key, 0)
+    }
+    timers = {}
+    for key, (count, seconds) in after["timers"].items():
+        previous_count, previous_seconds = before["timers"].get(key, (0, 0.0))
+        if count != previous_count:
+            timers[key] = [count - previous_count, seconds - previous_seconds]
+    return {"counters": counters, "timers": timers}
+
+
+def timer_totals(snapshot: Dict[str, Dict[Key, Any]], name: str, label: str) -> Dict[str, float]:
+    """Total seconds of a timer per value of one of its labels, e.g. seconds per stage."""
+    totals: Dict[str, float] = {}
+    for (metric, labels), (_, seconds) in snapshot["timers"].items():
+        if metric == name:
+            value = dict(labels).get(label, "")
+            totals[value] = totals.get(value, 0.0) + seconds
+    return totals
+
+
+# The process-wide registry every module records into
+metrics = Metrics()
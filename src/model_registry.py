@@ -0,0 +1,110 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import DEFAULT_MODEL, DEFAULT_PROFILE, QUERY_PROFILE, PIPELINE_PROFILES, MAX_RESIDENT_MODELS
+
+logger = logging.getLogger(__name__)
+
+# Loaded spaCy pipelines, keyed by (model_name, profile), least recently used first.
+# Every TextTransformer in the process shares these, so each model/profile is loaded
+# at most once, and at most MAX_RESIDENT_MODELS models stay loaded.
+_pipelines: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+_lock = threading.Lock()
+max_resident_models = MAX_RESIDENT_MODELS
+
+
+def get_profile(profile: str) -> Dict[str, Any]:
+    """Look up a pipeline profile from the configuration."""
+    try:
+        return PIPELINE_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown pipeline profile: {profile}")
+
+
+def get_pipeline(model_name: str = DEFAULT_MODEL, profile: str = DEFAULT_PROFILE):
+    """
+    Return the shared spaCy pipeline for a model and profile, loading it on first use.
+
+    Safe to call from concurrent request threads: a pipeline is only loaded once
+    even if several threads ask for it at the same time. Loading a model beyond
+    the resident limit evicts the least recently used one, which is loaded again
+    on its next use.
+    """
+    key = (model_name, profile)
+    pipeline = _pipelines.get(key)
+    if pipeline is not None:
+        _touch(key)
+        return pipeline
+
+    settings = get_profile(profile)
+    with _lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is None:
+            logger.info(f"Loading spaCy model {model_name} with profile {profile}")
+            pipeline = _load_model(
+                model_name,
+                exclude=settings.get("exclude", []),
+                disable=settings.get("disable", [])
+            )
+            _pipelines[key] = pipeline
+            _evict_models(keep=model_name)
+    return pipeline
+
+
+def _load_model(model_name: str, **kwargs):
+    # spaCy is imported on first load, so importing the registry stays cheap
+    import spacy
+
+    return spacy.load(model_name, **kwargs)
+
+
+def _touch(key: Tuple[str, str]) -> None:
+    """Mark a pipeline as most recently used, unless it was evicted meanwhile."""
+    try:
+        _pipelines.move_to_end(key)
+    except KeyError:
+        pass
+
+
+def _evict_models(keep: str) -> None:
+    """
+    Unload the least recently used models, with all their profiles, until at most
+    max_resident_models are loaded. Must be called with _lock held.
+    """
+    while True:
+        keys = list(_pipelines)
+        models = list(OrderedDict.fromkeys(name for name, _ in keys))
+        if len(models) <= max(max_resident_models, 1):
+            return
+        evicted = next(name for name in models if name != keep)
+        for key in keys:
+            if key[0] == evicted:
+                _pipelines.pop(key, None)
+        logger.info(f"Evicted spaCy model {evicted} to stay within {max_resident_models} resident models")
+
+
+def warm_up(model_name: str = DEFAULT_MODEL, profiles: Optional[Iterable[str]] = None) -> None:
+    """Load the pipelines a service needs before it starts taking traffic."""
+    if profiles is None:
+        profiles = [DEFAULT_PROFILE, QUERY_PROFILE]
+    for profile in profiles:
+        get_pipeline(model_name, profile)
+
+
+def unload(model_name: Optional[str] = None, profile: Optional[str] = None) -> None:
+    """
+    Drop loaded pipelines from the registry; with no arguments, drop all of them.
+    A pipeline is freed once in-flight calls using it have finished.
+    """
+    with _lock:
+        for key in list(_pipelines):
+            if (model_name is None or key[0] == model_name) and (profile is None or key[1] == profile):
+                del _pipelines[key]
+                logger.info(f"Unloaded spaCy model {key[0]} with profile {key[1]}")
+
+
+def loaded_pipelines() -> List[Tuple[str, str]]:
+    """List the (model_name, profile) pairs currently loaded."""
+    return list(_pipelines)
@@ -0,0 +1,120 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, List, Tuple
+
+from .config import PDF_MAX_PAGES, PDF_TIME_BUDGET, PDF_OCR_WORKERS, PDF_OCR_DPI, PDF_OCR_MIN_CHARS
+
+logger = logging.getLogger(__name__)
+
+
+def extract_pdf_text(file_path: str, max_pages: int = PDF_MAX_PAGES, time_budget: float = PDF_TIME_BUDGET,
+                     ocr_workers: int = PDF_OCR_WORKERS) -> str:
+    """
+    Extract the text of a PDF page by page, joining pages with blank lines.
+
+    Each page's text layer is read with pdfreader. Only pages with fewer than
+    PDF_OCR_MIN_CHARS characters of text are OCR'd, across a pool of ocr_workers
+    processes, and each of those pages is rendered on its own when its turn
+    comes. At most max_pages pages are read. Pages still missing when
+    time_budget seconds have passed are left empty.
+    """
+    deadline = time.monotonic() + time_budget
+    pages = list(_text_layer_pages(file_path, max_pages, deadline))
+    missing = [number for number, text in enumerate(pages, start=1) if len(text.strip()) < PDF_OCR_MIN_CHARS]
+    if missing:
+        logger.info(f"OCR of {len(missing)} of {len(pages)} pages without a text layer in {file_path}")
+        for number, text in _ocr_pages(file_path, missing, deadline, ocr_workers):
+            pages[number - 1] = text
+    return "\n\n".join(text.strip() for text in pages if text.strip())
+
+
+def _text_layer_pages(file_path: str, max_pages: int, deadline: float) -> Iterator[str]:
+    """Yield the text layer of each page, up to max_pages pages or the deadline."""
+    from pdfreader import SimplePDFViewer, PageDoesNotExist
+
+    with open(file_path, "rb") as fd:
+        viewer = SimplePDFViewer(fd)
+        for number in range(1, max_pages + 1):
+            if time.monotonic() > deadline:
+                logger.warning(f"Time budget used up after {number - 1} pages of {file_path}")
+                return
+            try:
+                viewer.render()
+                yield "".join(viewer.canvas.strings)
+                viewer.next()
+            except PageDoesNotExist:
+                return
+        logger.warning(f"Page limit of {max_pages} reached in {file_path}")
+
+
+def _ocr_page(file_path: str, page_number: int, dpi: int = PDF_OCR_DPI) -> str:
+    """Render a single page to an image and OCR it."""
+    from pdf2image import convert_from_path
+    from pytesseract import image_to_string
+
+    images = convert_from_path(file_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    return "".join(image_to_string(image) for image in images)
+
+
+def _ocr_pages(file_path: str, page_numbers: List[int], deadline: float,
+               workers: int) -> Iterator[Tuple[int, str]]:
+    """
+    OCR the given pages, yielding (page_number, text) as they finish. At most
+    2 * workers pages are rendered or in flight at a time; pages not started
+    before the deadline are skipped, and pages still running at the deadline
+    are abandoned and their worker processes terminated, so no OCR outlives
+    the call.
+    """
+    if workers <= 1:
+        for page_number in page_numbers:
+            if time.monotonic() > deadline:
+                logger.warning(f"Time budget used up, skipping OCR of remaining pages of {file_path}")
+                return
+            yield page_number, _safe_ocr_page(file_path, page_number)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(page_numbers)))
+    pending = iter(page_numbers)
+    in_flight = {}
+
+    def submit_next() -> None:
+        if time.monotonic() > deadline:
+            return
+        next_page = next(pending, None)
+        if next_page is not None:
+            in_flight[executor.submit(_safe_ocr_page, file_path, next_page)] = next_page
+
+    try:
+        for _ in range(workers * 2):
+            submit_next()
+        while in_flight:
+            remaining = deadline - time.monotonic()
+            done, _ = wait(in_flight, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"Time budget used up, abandoning OCR of {len(in_flight)} pages of {file_path}")
+                return
+            for future in done:
+                yield in_flight.pop(future), future.result()
+                submit_next()
+        if next(pending, None) is not None:
+            logger.warning(f"Time budget used up, skipping OCR of remaining pages of {file_path}")
+    finally:
+        _shutdown(executor, terminate=bool(in_flight))
+
+
+def _shutdown(executor: ProcessPoolExecutor, terminate: bool) -> None:
+    """Shut the pool down without waiting, terminating its workers if pages are still running."""
+    processes = list((getattr(executor, "_processes", None) or {}).values()) if terminate else []
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def _safe_ocr_page(file_path: str, page_number: int) -> str:
+    """OCR a page, logging failures and returning no text for it."""
+    try:
+        return _ocr_page(file_path, page_number)
+    except Exception as e:
+        logger.error(f"OCR of page {page_number} of {file_path} failed: {e}")
+        return ""
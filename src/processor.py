@@ -1,273 +1,472 @@
-from collections import Counter
+import hashlib
+import time
 import sys
 import os
+from importlib import metadata
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
-import spacy
-from bs4 import BeautifulSoup
-from langdetect import detect
-from typing import Dict, List, Any
-from pdfreader import SimplePDFViewer, PageDoesNotExist
-from pdf2image import convert_from_path
-from pytesseract import image_to_string
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
 import logging
-from .utils import remove_stopwords, extract_ngrams
+from .utils import extract_ngrams, ngram_field
+from .config import (
+    DEFAULT_MODEL, DEFAULT_PROFILE, QUERY_PROFILE, FIELD_COMPONENTS, BATCH_SIZE, N_PROCESS, CHUNK_THRESHOLD, CHUNK_SIZE,
+    LANGUAGE_MODELS, LANGUAGE_GROUP_WINDOW, NGRAM_SIZES, NGRAM_MIN_FREQUENCY, NGRAM_TOP_K, NGRAM_HASH_IDS
+)
+from .model_registry import get_pipeline, get_profile, warm_up
+from .language import detect_language, load_profiles
+from .html_cleaning import clean_html
+from .pdf_extraction import extract_pdf_text
+from .metrics import metrics, STAGE_SECONDS
+from .profiling import sampled
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class TextTransformer:
-    def __init__(self, model_name: str = "en_core_web_sm"):
-        """Initialize the TextTransformer with specified spaCy model."""
-        self.nlp = spacy.load(model_name)
+    def __init__(self, model_name: str = DEFAULT_MODEL, profile: str = DEFAULT_PROFILE,
+                 language_models: Optional[Dict[str, str]] = None):
+        """
+        Initialize the TextTransformer with specified spaCy model and pipeline profile.
+        Pipelines come from the process-wide model registry, so transformers are
+        cheap to create and share the loaded models.
+
+        Documents are routed by detected language to the models in language_models
+        (LANGUAGE_MODELS by default); model_name handles its own language and any
+        language without a model. Nothing is loaded until first use or warm_up.
+        """
+        self.model_name = model_name
+        self.profile = profile
+        self.chunk_threshold = CHUNK_THRESHOLD
+        self.chunk_size = CHUNK_SIZE
+        self.language_models = dict(LANGUAGE_MODELS if language_models is None else language_models)
+        self.language_models[model_name.split("_")[0]] = model_name
+        self._unavailable_models = set()
+        self._package_versions = {}
+        get_profile(profile)  # fail early on an unknown profile
+
+    def warm_up(self, profiles: Optional[Iterable[str]] = None) -> None:
+        """
+        Load model_name for the given profiles (by default the transformer's own
+        and QUERY_PROFILE), and the language profiles if any of them detects the
+        language, so the first requests do not pay for loading them.
+        """
+        profiles = [self.profile, QUERY_PROFILE] if profiles is None else list(profiles)
+        warm_up(self.model_name, profiles)
+        if any(self._get_profile(profile).get("detect_language", True) for profile in profiles):
+            load_profiles()
+
+    @property
+    def nlp(self):
+        """The spaCy pipeline for this transformer's default profile."""
+        return self._get_nlp(self.profile)
+
+    def _get_nlp(self, profile: str, lang: Optional[str] = None):
+        """
+        Return the shared spaCy pipeline for a profile and language, loading it on
+        first use. Languages whose model is missing fall back to model_name.
+        """
+        model_name = self._model_for_language(lang)
+        if model_name != self.model_name:
+            try:
+                return get_pipeline(model_name, profile)
+            except OSError as e:
+                logger.warning(f"Model {model_name} for language {lang} is unavailable, using {self.model_name}: {e}")
+                self._unavailable_models.add(model_name)
+        return get_pipeline(self.model_name, profile)
+
+    def _model_for_language(self, lang: Optional[str]) -> str:
+        """Name of the model that processes documents in the given language."""
+        model_name = self.language_models.get(lang, self.model_name)
+        if model_name in self._unavailable_models:
+            return self.model_name
+        return model_name
+
+    def fingerprint(self, profile: Optional[str] = None) -> str:
+        """
+        Identify the models, their versions and the profile that produce a result:
+        model_name, then every model documents are routed to by language. No model
+        is loaded for this; versions are those of the installed packages. A routed
+        model that cannot be used is "missing", as model_name handles its
+        languages instead.
+        """
+        profile = profile or self.profile
+        models = [f"{self.model_name}-{self._package_version(self.model_name) or 'unknown'}"] + [
+            f"{model_name}-{self._routed_model_version(model_name)}"
+            for model_name in sorted(set(self.language_models.values()) - {self.model_name})
+        ]
+        return f"{'+'.join(models)}:{profile}"
+
+    def _routed_model_version(self, model_name: str) -> str:
+        """Installed package version of a routed model, or "missing" if it cannot be used."""
+        if model_name in self._unavailable_models:
+            return "missing"
+        return self._package_version(model_name) or "missing"
+
+    def _package_version(self, model_name: str) -> Optional[str]:
+        """Installed package version of a model, looked up once per model; None if it is not installed."""
+        if model_name not in self._package_versions:
+            try:
+                self._package_versions[model_name] = metadata.version(model_name)
+            except metadata.PackageNotFoundError:
+                self._package_versions[model_name] = None
+        return self._package_versions[model_name]
+
+    def content_hash(self, raw_document: Dict[str, Any]) -> str:
+        """Hash the fields of a raw document that process_document reads."""
+        digest = hashlib.sha256()
+        for value in (raw_document.get('url'), raw_document.get('type')):
+            digest.update(str(value).encode('utf-8'))
+            digest.update(b"\0")
+        digest.update(raw_document['text'].encode('utf-8'))
+        return digest.hexdigest()
+
+    def _get_profile(self, profile: str) -> Dict[str, Any]:
+        """Look up a pipeline profile from the configuration."""
+        return get_profile(profile)
+
+    def resolve_fields(self, profile: str, fields: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Return the result fields to compute: all fields of the profile, or the
+        requested subset of them, in the profile's order. Raises ValueError for
+        fields the profile does not compute.
+        """
+        available = self._get_profile(profile)["fields"]
+        if fields is None:
+            return list(available)
+        if isinstance(fields, str):
+            raise ValueError("fields must be a list of field names")
+        fields = set(fields)
+        unsupported = sorted(str(field) for field in fields if field not in available)
+        if unsupported:
+            raise ValueError(f"Unsupported fields for profile {profile}: {', '.join(unsupported)}")
+        return [field for field in available if field in fields]
+
+    def _disabled_components(self, fields: List[str]) -> List[str]:
+        """Pipeline components that none of the requested fields need."""
+        return [
+            component
+            for field, components in FIELD_COMPONENTS.items() if field not in fields
+            for component in components
+        ]
+        
+    @sampled("document", lambda self, raw_document, *args, **kwargs: {
+        "document_id": raw_document.get('_id'), "size": len(raw_document.get('text') or "")
+    })
+    def process_document(self, raw_document: Dict[str, Any], profile: Optional[str] = None,
+                         fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Process a raw document and return structured data: the profile's fields,
+        or only the requested subset of them (see resolve_fields).
+
+        Documents longer than CHUNK_THRESHOLD characters are streamed through the
+        pipeline in chunks (see _build_chunked_index).
+        """
+        profile = profile or self.profile
+        settings = self._get_profile(profile)
+        fields = self.resolve_fields(profile, fields)
+        content, lang = self._prepare_document(raw_document, settings.get("detect_language", True))
+        nlp = self._get_nlp(profile, lang)
+        
+        # Process with spaCy
+        if len(content) > self.chunk_threshold:
+            with metrics.timer(STAGE_SECONDS, stage="chunked"):
+                index = self._build_chunked_index(nlp, content, fields)
+        else:
+            with metrics.timer(STAGE_SECONDS, stage="spacy"):
+                doc = nlp(content, disable=self._disabled_components(fields))
+            with metrics.timer(STAGE_SECONDS, stage="index"):
+                index = self._build_lemma_index(doc, entities="named_entities" in fields)
         
-    def process_document(self, raw_document: Dict[str, Any]) -> Dict[str, Any]:
-        #TODO: Implement this method
-        """Process a raw document and return structured data."""
-        doc_id = raw_document['_id']
+        return self._build_document_result(raw_document, index, fields, lang)
+
+    def process_documents(
+        self,
+        raw_documents: Iterable[Dict[str, Any]],
+        batch_size: int = BATCH_SIZE,
+        n_process: int = N_PROCESS,
+        profile: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Process many raw documents with spaCy's batched nlp.pipe.
+
+        Documents are read LANGUAGE_GROUP_WINDOW at a time, cleaned and routed
+        by detected language, and each model gets its documents of the window as
+        one nlp.pipe stream; results are yielded in input order, one per raw
+        document. Documents above CHUNK_THRESHOLD characters are processed in
+        chunks instead. fields selects the result fields as for process_document.
+        """
+        profile = profile or self.profile
+        settings = self._get_profile(profile)
+        fields = self.resolve_fields(profile, fields)
+        disable = self._disabled_components(fields)
+        entities = "named_entities" in fields
+        detect = settings.get("detect_language", True)
+        raw_documents = iter(raw_documents)
+
+        while True:
+            window = []
+            for raw_document in raw_documents:
+                content, lang = self._prepare_document(raw_document, detect)
+                window.append((raw_document, content, lang))
+                if len(window) >= LANGUAGE_GROUP_WINDOW:
+                    break
+            if not window:
+                return
+
+            # Group the window by model, keeping each document's position
+            groups: Dict[str, List[int]] = {}
+            for position, (_, _, lang) in enumerate(window):
+                groups.setdefault(self._model_for_language(lang), []).append(position)
+
+            results: List[Optional[Dict[str, Any]]] = [None] * len(window)
+            for positions in groups.values():
+                nlp = self._get_nlp(profile, window[positions[0]][2])
+                # Large documents keep their slot in the batch, but leave the text out of it
+                contents = (
+                    "" if len(window[position][1]) > self.chunk_threshold else window[position][1]
+                    for position in positions
+                )
+                # The spaCy stage is the time spent waiting on the pipe for each document
+                started = time.perf_counter()
+                docs = nlp.pipe(contents, batch_size=batch_size, n_process=n_process, disable=disable)
+                for position, doc in zip(positions, docs):
+                    metrics.observe(STAGE_SECONDS, time.perf_counter() - started, stage="spacy")
+                    raw_document, content, lang = window[position]
+                    if len(content) > self.chunk_threshold:
+                        with metrics.timer(STAGE_SECONDS, stage="chunked"):
+                            index = self._build_chunked_index(nlp, content, fields)
+                    else:
+                        with metrics.timer(STAGE_SECONDS, stage="index"):
+                            index = self._build_lemma_index(doc, entities=entities)
+                    results[position] = self._build_document_result(raw_document, index, fields, lang)
+                    started = time.perf_counter()
+
+            yield from results
+
+    def _prepare_document(self, raw_document: Dict[str, Any], detect: bool = True) -> Tuple[str, Optional[str]]:
+        """
+        Clean a raw document's text and detect its language; the language is
+        None when detection is skipped.
+        """
         content = raw_document['text']
         
         # Clean HTML if present
         if raw_document.get('type') == 'html':
-            content = self._clean_html(content)
+            with metrics.timer(STAGE_SECONDS, stage="html"):
+                content = self._clean_html(content)
         
-        # Check if content is sufficient for language detection
-        if len(content.strip()) < 20:  # Adjust the threshold as needed
-            logger.warning(f"Content too short for language detection: {content}")
-            lang = "unknown"
-        else:
-            # Detect language
-            try:
-                lang = detect(content)
-            except LangDetectException:
-                logger.error(f"Language detection failed for document ID: {doc_id}")
-                lang = "unknown"
-        
-        # Process with spaCy
-        doc = self.nlp(content)
-        
-        # Extract structured data
-        filtered_tokens = [
-            token.lemma_ for token in doc if not token.is_punct and not token.is_space and not token.is_stop
-        ]
+        lang = None
+        if detect:
+            with metrics.timer(STAGE_SECONDS, stage="language"):
+                lang = detect_language(content, raw_document['_id'])
+        return content, lang
 
-        # Initialize result dictionary
+    def _build_document_result(self, raw_document: Dict[str, Any], index: Dict[str, Any],
+                               fields: List[str], lang: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the structured result for a raw document from its lemma index:
+        the given fields, keeping the most frequent n-grams, plus the detected
+        language when there is one.
+        """
         result = {
             "url": raw_document.get('url'),
-            "doc_id": doc_id,
-            "total_length": len([token for token in doc if not token.is_space and not token.is_punct]),
-            "tokens": [],
-            "bigrams": [],
-            "trigrams": [],
-            "named_entities": [],
-            "parts_of_speech": []
+            "doc_id": raw_document['_id'],
+            "total_length": index["total_length"]
         }
+        if lang is not None:
+            result["language"] = lang
+        return self._analyze(index, fields, result, NGRAM_MIN_FREQUENCY, NGRAM_TOP_K)
 
-        # Count and sort tokens by frequency and alphabetically
-        token_freq = Counter(filtered_tokens)
-        sorted_tokens = sorted(
-            token_freq.items(),
-            key=lambda x: (-x[1], x[0])
-        )
-
-        # Add each token to the result, repeated for its occurrences with respective positions
-        for token, freq in sorted_tokens:
-            positions = [doc_token.idx for doc_token in doc if doc_token.lemma_ == token and not doc_token.is_punct and not doc_token.is_space and not doc_token.is_stop]
-            for pos in positions:
-                result["tokens"].append({
-                    "token": token,
-                    "lemma": token,
-                    "frequency": freq,
-                    "position": pos
-                })
-
-        # Generate and sort bigrams
-        bigram_freq = self._extract_ngrams(filtered_tokens, 2)
-        sorted_bigrams = sorted(
-            bigram_freq.items(),
-            key=lambda x: (-x[1], x[0])
-        )
-        result["bigrams"] = [
-            {"bigram": list(bigram), "frequency": freq}
-            for bigram, freq in sorted_bigrams
-        ]
+    def _analyze(self, index: Dict[str, Any], fields: List[str], result: Dict[str, Any],
+                 min_frequency: int = 1, top_k: int = 0) -> Dict[str, Any]:
+        """
+        The analysis core shared by documents and queries: add the given fields,
+        computed from a lemma index, to result. Fields that are not given are
+        neither computed nor added.
+        """
+        if "tokens" in fields:
+            with metrics.timer(STAGE_SECONDS, stage="tokens"):
+                result["tokens"] = self._extract_tokens(index)
 
-        # Generate and sort trigrams
-        trigram_freq = self._extract_ngrams(filtered_tokens, 3)
-        sorted_trigrams = sorted(
-            trigram_freq.items(),
-            key=lambda x: (-x[1], x[0])
-        )
-        result["trigrams"] = [
-            {"trigram": list(trigram), "frequency": freq}
-            for trigram, freq in sorted_trigrams
-        ]
+        # Count every configured n-gram order that is requested
+        sizes = [n for n in NGRAM_SIZES if ngram_field(n) in fields]
+        if sizes:
+            with metrics.timer(STAGE_SECONDS, stage="ngrams"):
+                result.update(extract_ngrams(index["lemmas"], sizes, min_frequency, top_k, NGRAM_HASH_IDS))
 
-        # Extract named entities with their character positions
-        for ent in doc.ents:
-            result["named_entities"].append({
-                "entity": ent.text,
-                "type": ent.label_,
-                "position": [ent.start_char, ent.end_char]
-            })
+        # Named entities with their character positions
+        if "named_entities" in fields:
+            with metrics.timer(STAGE_SECONDS, stage="entities"):
+                result["named_entities"] = list(index["entities"])
 
-        # Add parts of speech for valid tokens
-        for token in doc:
-            if not token.is_punct and not token.is_space and not token.is_stop:
-                result["parts_of_speech"].append({
-                    "token": token.text,
-                    "pos_tag": token.pos_,
-                    "position": token.idx
-                })
+        # Parts of speech for valid tokens
+        if "parts_of_speech" in fields:
+            with metrics.timer(STAGE_SECONDS, stage="pos"):
+                result["parts_of_speech"] = self._extract_pos(index["tokens"])
 
         return result
     
-    def process_query(self, query: str) -> Dict[str, Any]:
+    @sampled("query", lambda self, query, *args, **kwargs: {"size": len(query)})
+    def process_query(self, query: str, profile: str = QUERY_PROFILE,
+                      fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
         """
         Process the input query and return a JSON-like result with token frequencies,
-        bigrams, trigrams, named entities, and parts of speech.
+        bigrams, trigrams, named entities, and parts of speech, as far as the
+        pipeline profile computes them, or only the requested fields. Query
+        n-grams are never pruned.
         """
+        fields = self.resolve_fields(profile, fields)
         query = query.lower()
-        doc = self.nlp(query)  # Tokenize and process the text with spaCy
-
-        # Filter tokens to exclude punctuation, spaces, and stop words, using lemmas
-        filtered_tokens = [
-            token.lemma_ for token in doc if not token.is_punct and not token.is_space and not token.is_stop
-        ]
+        with metrics.timer(STAGE_SECONDS, stage="query"):
+            doc = self._get_nlp(profile)(query, disable=self._disabled_components(fields))
+            return self._build_query_result(doc, fields)
 
-        # Initialize result dictionary
-        result = {
-            "total_length": len([token for token in doc if not token.is_space and not token.is_punct]),  # Word count excluding punctuation and spaces
-            "tokens": [],
-            "bigrams": [],
-            "trigrams": [],
-            "named_entities": self._extract_entities(doc),  
-            "parts_of_speech": self._extract_pos(doc)  
-        }
+    @sampled("query_batch", lambda self, queries, *args, **kwargs: {
+        "queries": len(queries), "size": sum(len(query) for query in queries)
+    })
+    def process_queries(self, queries: List[str], profile: str = QUERY_PROFILE,
+                        batch_size: int = BATCH_SIZE, fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Process several queries in one batched nlp.pipe call. Returns the same
+        results as calling process_query on each query, in input order.
+        """
+        fields = self.resolve_fields(profile, fields)
+        with metrics.timer(STAGE_SECONDS, stage="query_batch"):
+            docs = self._get_nlp(profile).pipe(
+                (query.lower() for query in queries), batch_size=batch_size, disable=self._disabled_components(fields)
+            )
+            return [self._build_query_result(doc, fields) for doc in docs]
 
-        # Count and sort tokens by frequency and alphabetically
-        token_freq = Counter(filtered_tokens)
-        sorted_tokens = sorted(
-            token_freq.items(),
-            key=lambda x: (-x[1], x[0])  # Sort by frequency (descending), then alphabetically
-        )
+    def _build_query_result(self, doc, fields: List[str]) -> Dict[str, Any]:
+        """Build the process_query result for an analysed query."""
+        index = self._build_lemma_index(doc, entities="named_entities" in fields)
+        # Word count excluding punctuation and spaces
+        return self._analyze(index, fields, {"total_length": index["total_length"]})
 
-        # Add each token to the result, repeated for its occurrences with respective positions
-        for token, freq in sorted_tokens:
-            # Find all positions where this lemma occurs
-            positions = [doc_token.idx for doc_token in doc if doc_token.lemma_ == token and not doc_token.is_punct and not doc_token.is_space and not doc_token.is_stop]
-            # Add the token multiple times with each position
-            for pos in positions:
-                result["tokens"].append({
-                    "token": token,
-                    "lemma": token,
-                    "frequency": freq,
-                    "position": pos
-                })
+    def _clean_html(self, html_content: str) -> str:
+        """Remove HTML tags and boilerplate and extract clean text (see src/html_cleaning.py)."""
+        return clean_html(html_content)
+    def _clean_pdf(self, file_path: str) -> str:
+        """Extract the text of a PDF, OCR'ing pages without a text layer (see src/pdf_extraction.py)."""
+        return extract_pdf_text(file_path)
 
-        # Generate and sort bigrams
-        bigram_freq = self._extract_ngrams(filtered_tokens, 2)
-        sorted_bigrams = sorted(
-            bigram_freq.items(),
-            key=lambda x: (-x[1], x[0])
-        )
-        result["bigrams"] = [
-            {"bigram": list(bigram), "frequency": freq}
-            for bigram, freq in sorted_bigrams
-        ]
+    def _build_lemma_index(self, doc, index: Optional[Dict[str, Any]] = None, offset: int = 0,
+                           entities: bool = True) -> Dict[str, Any]:
+        """
+        Walk a spaCy document once and build an inverted index of its valid tokens.
 
-        # Generate and sort trigrams
-        trigram_freq = self._extract_ngrams(filtered_tokens, 3)
-        sorted_trigrams = sorted(
-            trigram_freq.items(),
-            key=lambda x: (-x[1], x[0])
-        )
-        result["trigrams"] = [
-            {"trigram": list(trigram), "frequency": freq}
-            for trigram, freq in sorted_trigrams
-        ]
+        Returns a dict with the word count ("total_length"), the lemmas of valid
+        tokens in document order ("lemmas"), (text, POS tag, position) for each valid
+        token ("tokens"), a mapping of lemma -> character positions ("positions")
+        and the named entities ("entities", left empty unless entities is set). The
+        frequency of a lemma is the length of its position list.
 
-        # Extract named entities with their character positions
-        for ent in doc.ents:
-            result["named_entities"].append({
+        Passing an existing index appends the document to it, with character
+        positions shifted by `offset`; this is how chunks of one text are merged.
+        """
+        if index is None:
+            index = {"total_length": 0, "lemmas": [], "tokens": [], "positions": {}, "entities": []}
+        lemmas = index["lemmas"]
+        tokens = index["tokens"]
+        positions = index["positions"]
+        total_length = 0
+        for token in doc:
+            if token.is_punct or token.is_space:
+                continue
+            total_length += 1
+            if token.is_stop:
+                continue
+            lemma = token.lemma_
+            position = token.idx + offset
+            lemmas.append(lemma)
+            tokens.append((token.text, token.pos_, position))
+            positions.setdefault(lemma, []).append(position)
+        index["total_length"] += total_length
+        for ent in (doc.ents if entities else ()):
+            index["entities"].append({
                 "entity": ent.text,
                 "type": ent.label_,
-                "position": [ent.start_char, ent.end_char]
+                "position": [ent.start_char + offset, ent.end_char + offset]
             })
+        return index
 
-        # Add parts of speech for valid tokens
-        for token in doc:
-            if not token.is_punct and not token.is_space and not token.is_stop:
-                result["parts_of_speech"].append({
-                    "token": token.text,
-                    "pos_tag": token.pos_,
-                    "position": token.idx
-                })
+    def _build_chunked_index(self, nlp, content: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Build the lemma index of a long text by streaming it through the pipeline
+        in chunks, so only one chunk's Doc is held in memory at a time.
 
-        return result
-    def _clean_html(self, html_content: str) -> str:
-        """Remove HTML tags and extract clean text."""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        return soup.get_text(separator=' ', strip=True)
-    def _clean_pdf(self, file_path: str) -> str:
-        def extract_with_pdfreader():
-            fd = open(file_path, "rb")
-            viewer = SimplePDFViewer(fd)
-            text = ""
-            try:
-                while True:
-                    viewer.render()
-                    text += "".join(viewer.canvas.strings) 
-                    viewer.next()
-            except PageDoesNotExist:
-                pass
-            return text.strip()
-
-        def extract_with_ocr():
-            # Extract text using OCR
-            images = convert_from_path(file_path)
-            text = ""
-            for img in images:
-                text += image_to_string(img)
-            return text.strip()
-
-        text = extract_with_pdfreader()
-        
-        if text:
-            return text
-        else:
-            return extract_with_ocr()
-    
-    def _extract_ngrams(self,tokens, n) -> Counter:
+        Positions are rebased onto the full text, and because the lemma list is
+        concatenated across chunks, n-grams spanning a chunk boundary are kept.
+        Components that none of the given fields (by default the transformer's
+        profile fields) need are skipped.
         """
-        Generate n-grams from a list of tokens and count their frequencies.
+        fields = self.resolve_fields(self.profile) if fields is None else fields
+        # The chunks are cut lazily, each carrying its offset through the pipeline
+        chunks = ((chunk, offset) for offset, chunk in self._split_into_chunks(content, self.chunk_size))
+        index = None
+        docs = nlp.pipe(chunks, as_tuples=True, batch_size=1, disable=self._disabled_components(fields))
+        for doc, offset in docs:
+            index = self._build_lemma_index(doc, index, offset, entities="named_entities" in fields)
+        return index
+
+    def _split_into_chunks(self, content: str, max_chars: int) -> Iterator[Tuple[int, str]]:
         """
-        ngrams = zip(*[tokens[i:] for i in range(n)])
-        return Counter(ngrams)
-    
-    def _extract_entities(self, doc) -> List[Dict[str, Any]]:
-            """
-            Extract named entities from a spaCy document with their character positions.
-            """
-            entities = []
-            for ent in doc.ents:
-                entities.append({
-                    "entity": ent.text,
-                    "type": ent.label_,
-                    "position": [ent.start_char, ent.end_char]
+        Split text into (offset, chunk) pieces of at most max_chars characters,
+        cutting at the last paragraph break, else sentence end, else whitespace in
+        each window. The chunks are contiguous, so offsets map back into the text.
+        """
+        start = 0
+        length = len(content)
+        while start < length:
+            end = start + max_chars
+            if end >= length:
+                yield start, content[start:]
+                return
+            cut = content.rfind("\n\n", start, end)
+            if cut > start:
+                cut += 2
+            else:
+                cut = max(content.rfind(mark, start, end) for mark in (". ", "! ", "? ", ".\n", "!\n", "?\n"))
+                if cut > start:
+                    cut += 1
+            if cut <= start:
+                cut = max(content.rfind(" ", start, end), content.rfind("\n", start, end))
+            if cut <= start:
+                cut = end
+            yield start, content[start:cut]
+            start = cut
+
+    def _extract_tokens(self, index: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Expand a lemma index into one entry per occurrence, sorted by frequency
+        (descending) and then alphabetically.
+        """
+        sorted_tokens = sorted(
+            index["positions"].items(),
+            key=lambda x: (-len(x[1]), x[0])
+        )
+        tokens = []
+        for lemma, positions in sorted_tokens:
+            freq = len(positions)
+            for pos in positions:
+                tokens.append({
+                    "token": lemma,
+                    "lemma": lemma,
+                    "frequency": freq,
+                    "position": pos
                 })
-            return entities
+        return tokens
 
-    def _extract_pos(self, doc) -> List[Dict[str, Any]]:
+    def _extract_pos(self, tokens) -> List[Dict[str, Any]]:
         """
-        Extract parts of speech for valid tokens from a spaCy document.
+        Extract parts of speech for the valid tokens of a lemma index.
         """
         pos_tags = []
-        for token in doc:
-            if not token.is_punct and not token.is_space and not token.is_stop:
-                pos_tags.append({
-                    "token": token.text,
-                    "pos_tag": token.pos_,
-                    "position": token.idx
-                })
-        return pos_tags
\ No newline at end of file
+        for text, pos_tag, position in tokens:
+            pos_tags.append({
+                "token": text,
+                "pos_tag": pos_tag,
+                "position": position
+            })
+        return pos_tags
@@ -0,0 +1,238 @@
+import argparse
+import cProfile
+import functools
+import itertools
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_TRACE_MEMORY, PROFILE_MEMORY_TOP
+
+logger = logging.getLogger(__name__)
+
+# Only one sampled call is profiled at a time per process: cProfile cannot nest, and a
+# call made inside a profiled one (e.g. a document of a profiled queue chunk) is already
+# covered by the outer profile.
+_active = threading.Lock()
+
+
+class Profiler:
+    """
+    Runs a sampled share of calls under cProfile, and optionally tracemalloc, and
+    dumps each profile to a directory that keeps the newest max_files of them.
+
+    Every profile is a pstats file (<stem>.prof) with a JSON sidecar (<stem>.json)
+    holding the kind of call, its wall time, the attributes passed by the caller
+    (document IDs, sizes) and, when tracing memory, the peak and the largest
+    allocations still held when the call returned.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES,
+                 trace_memory: bool = False, memory_top: int = PROFILE_MEMORY_TOP, seed: Optional[int] = None):
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_files = max_files
+        self.trace_memory = trace_memory
+        self.memory_top = memory_top
+        self._random = random.Random(seed)
+        self._sequence = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def should_sample(self) -> bool:
+        return self.sample_rate >= 1 or self._random.random() < self.sample_rate
+
+    def sample(self, kind: str, **attributes):
+        """Context manager that profiles the block if this call is sampled."""
+        if not self.enabled or not self.should_sample():
+            return nullcontext()
+        return self.profile(kind, **attributes)
+
+    @contextmanager
+    def profile(self, kind: str, **attributes) -> Iterator[None]:
+        """Profile the block unconditionally, unless another profile is running."""
+        if not _active.acquire(blocking=False):
+            yield
+            return
+        try:
+            started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            elif self.trace_memory:
+                tracemalloc.reset_peak()
+            profile = cProfile.Profile()
+            failed = False
+            started = time.perf_counter()
+            profile.enable()
+            try:
+                yield
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                profile.disable()
+                record = dict(attributes, kind=kind, pid=os.getpid(), timestamp=time.time(),
+                              seconds=time.perf_counter() - started, failed=failed)
+                if self.trace_memory:
+                    record["memory"] = self._memory_report()
+                    if started_tracing:
+                        tracemalloc.stop()
+                try:
+                    self._write(kind, profile, record)
+                except OSError as e:
+                    logger.warning(f"Could not write {kind} profile to {self.directory}: {e}")
+        finally:
+            _active.release()
+
+    def _memory_report(self) -> Dict[str, Any]:
+        _, peak = tracemalloc.get_traced_memory()
+        statistics = tracemalloc.take_snapshot().statistics("lineno")[:self.memory_top]
+        return {
+            "peak_bytes": peak,
+            "top": [
+                {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 "size_bytes": stat.size, "count": stat.count}
+                for stat in statistics
+            ]
+        }
+
+    def _write(self, kind: str, profile: cProfile.Profile, record: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(record["timestamp"]))
+        stem = os.path.join(self.directory, f"{stamp}-{kind}-{os.getpid()}-{next(self._sequence)}")
+        profile.dump_stats(stem + ".prof")
+        with open(stem + ".json", "w") as f:
+            json.dump(record, f, default=str)
+        self._rotate()
+
+    def _rotate(self) -> None:
+        """Delete the oldest profiles beyond max_files."""
+        profiles = sorted(
+            (os.path.getmtime(path), path) for path in _profile_paths(self.directory)
+        )
+        for _, path in profiles[:max(len(profiles) - self.max_files, 0)]:
+            for file in (path, path[:-len(".prof")] + ".json"):
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+
+
+# The process-wide profiler, configured by PROFILE_* in src/config.py
+profiler = Profiler(PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_TRACE_MEMORY)
+
+
+def sampled(kind: str, describe: Callable[..., Dict[str, Any]], using: Optional[Profiler] = None):
+    """
+    Decorator that profiles a sampled share of calls to the function. describe
+    receives the call's arguments and returns the attributes recorded with the
+    profile. Uses the process-wide profiler unless another one is given. If
+    profiling is disabled when the function is defined, the function is returned
+    as is, so it costs nothing.
+    """
+    active = using or profiler
+
+    def decorate(function):
+        if not active.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not active.should_sample():
+                return function(*args, **kwargs)
+            try:
+                attributes = describe(*args, **kwargs)
+            except Exception:
+                attributes = {}
+            with active.profile(kind, **attributes):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _profile_paths(directory: str) -> List[str]:
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names if name.endswith(".prof")]
+
+
+def load_profiles(directory: str, kind: Optional[str] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """List the (pstats path, record) pairs in a profile directory, oldest first."""
+    profiles = []
+    for path in sorted(_profile_paths(directory)):
+        try:
+            with open(path[:-len(".prof")] + ".json") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            record = {}
+        if kind is None or record.get("kind") == kind:
+            profiles.append((path, record))
+    return profiles
+
+
+def aggregate(directory: str, top: int = 20, kind: Optional[str] = None, sort: str = "cumulative",
+              stream=None) -> Optional[pstats.Stats]:
+    """
+    Merge the profiles in a directory and print the top functions by the given
+    pstats sort key, after a summary of the profiled calls and, for profiles with
+    memory tracing, the locations holding the most memory.
+    """
+    stream = stream or sys.stdout
+    profiles = load_profiles(directory, kind)
+    if not profiles:
+        print(f"No profiles found in {directory}", file=stream)
+        return None
+
+    records = [record for _, record in profiles]
+    kinds: Dict[str, int] = {}
+    for record in records:
+        kinds[record.get("kind", "unknown")] = kinds.get(record.get("kind", "unknown"), 0) + 1
+    print(f"{len(profiles)} profiles: " + ", ".join(f"{count} {name}" for name, count in sorted(kinds.items())),
+          file=stream)
+    print(f"Total profiled time: {sum(record.get('seconds', 0) for record in records):.3f}s", file=stream)
+    print("Slowest calls:", file=stream)
+    for record in sorted(records, key=lambda record: record.get("seconds", 0), reverse=True)[:5]:
+        subject = record.get("document_id", record.get("document_ids", ""))
+        print(f"  {record.get('seconds', 0):.3f}s {record.get('kind')} size={record.get('size')} {subject}",
+              file=stream)
+
+    memory: Dict[str, int] = {}
+    for record in records:
+        for entry in record.get("memory", {}).get("top", []):
+            memory[entry["location"]] = memory.get(entry["location"], 0) + entry["size_bytes"]
+    if memory:
+        peak = max(record["memory"]["peak_bytes"] for record in records if "memory" in record)
+        print(f"Peak traced memory: {peak} bytes; largest retained allocations:", file=stream)
+        for location, size in sorted(memory.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"  {size:>12} {location}", file=stream)
+
+    stats = pstats.Stats(*(path for path, _ in profiles), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Aggregate sampled profiles into the top hot functions.")
+    parser.add_argument("directory", nargs="?", default=PROFILE_DIR)
+    parser.add_argument("--top", type=int, default=20, help="number of functions to show")
+    parser.add_argument("--kind", help="only profiles of this kind, e.g. document, query, queue_chunk")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key, e.g. cumulative, tottime, calls")
+    args = parser.parse_args(argv)
+    aggregate(args.directory, args.top, args.kind, args.sort)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
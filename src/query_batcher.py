@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import QUERY_PROFILE, QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBatcher:
+    """
+    Micro-batches concurrent process_query calls into one batched pipeline call.
+
+    Queries submitted from request threads are gathered by a dispatcher thread
+    until max_batch_size queries are waiting or max_wait seconds have passed
+    since the oldest one arrived, then analysed together with
+    transformer.process_queries and handed back to their callers. Batches run
+    one after another on the dispatcher thread, so a query can wait up to
+    max_wait plus the time of the batch in progress for its own batch to start.
+
+    Has the process_query/fingerprint interface of TextTransformer, so it can be
+    passed to QueryCache.process_query in place of the transformer.
+    """
+
+    def __init__(self, transformer, max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+                 max_wait: float = QUERY_BATCH_MAX_WAIT, clock=time.monotonic):
+        self.transformer = transformer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._clock = clock
+        self._pending: "deque[Tuple[str, str, Optional[Tuple[str, ...]], Future, float]]" = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.batches = 0
+        self.queries = 0
+
+    def fingerprint(self, profile: str = QUERY_PROFILE) -> str:
+        """The fingerprint of the underlying transformer."""
+        return self.transformer.fingerprint(profile)
+
+    def process_query(self, query: str, profile: str = QUERY_PROFILE,
+                      fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Process a query as part of the next batch and wait for its result."""
+        return self.submit(query, profile, fields).result()
+
+    def submit(self, query: str, profile: str = QUERY_PROFILE, fields: Optional[Iterable[str]] = None) -> Future:
+        """Queue a query for the next batch; the returned future holds its result."""
+        future = Future()
+        fields = None if fields is None else tuple(fields)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("QueryBatcher is closed")
+            self._pending.append((query, profile, fields, future, self._clock()))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._thread.start()
+            # Wake the dispatcher for a new batch, or when the current one is full
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._condition.notify()
+        return future
+
+    def close(self) -> None:
+        """Process the queries already submitted, then stop the dispatcher thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of batches run and queries processed."""
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "average_batch_size": self.queries / self.batches if self.batches else 0.0
+        }
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                deadline = self._pending[0][4] + self.max_wait
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch_size))]
+            self._process_batch(batch)
+
+    def _process_batch(self, batch: List[Tuple[str, str, Optional[Tuple[str, ...]], Future, float]]) -> None:
+        """Run a batch through the transformer, one process_queries call per profile and field set."""
+        self.batches += 1
+        self.queries += len(batch)
+        by_request: Dict[Tuple[str, Optional[Tuple[str, ...]]], List[Tuple[str, Future]]] = {}
+        for query, profile, fields, future, _ in batch:
+            by_request.setdefault((profile, fields), []).append((query, future))
+
+        for (profile, fields), items in by_request.items():
+            try:
+                results = self.transformer.process_queries(
+                    [query for query, _ in items], profile=profile, batch_size=len(items), fields=fields
+                )
+            except Exception as e:
+                # Fall back to one query at a time, so a bad query only fails its own request
+                logger.warning(f"Batch of {len(items)} queries failed, processing them one by one: {e}")
+                for query, future in items:
+                    try:
+                        future.set_result(self.transformer.process_query(query, profile=profile, fields=fields))
+                    except Exception as query_error:
+                        future.set_exception(query_error)
+                continue
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
@@ -0,0 +1,118 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .config import (
+    QUERY_PROFILE, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL, QUERY_CACHE_MAX_BYTES
+)
+from .metrics import metrics, QUERY_CACHE_HITS, QUERY_CACHE_MISSES, QUERY_CACHE_HIT_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of process_query results with a per-entry TTL.
+
+    Entries are evicted least-recently-used first once either max_entries or
+    max_bytes (the JSON size of the cached results) is exceeded. A max_entries of
+    0 disables the cache.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, ttl: float = QUERY_CACHE_TTL,
+                 max_bytes: int = QUERY_CACHE_MAX_BYTES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def process_query(self, transformer, query: str, profile: str = QUERY_PROFILE,
+                      fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Return transformer.process_query(query, profile, fields), answering from the cache when possible.
+
+        The key holds the lowercased query, which is exactly the text process_query
+        analyses, the requested fields, and the model fingerprint, so swapping the
+        model or profile never serves stale results. Cached results are shared; do
+        not mutate them.
+        """
+        key = (transformer.fingerprint(profile), None if fields is None else tuple(sorted(set(fields))), query.lower())
+        result = self.get(key)
+        if result is None:
+            result = transformer.process_query(query, profile=profile, fields=fields)
+            self.put(key, result)
+        return result
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Return the cached value for a key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value: Any) -> None:
+        """Store a value, evicting least-recently-used entries to stay within bounds."""
+        if self.max_entries <= 0:
+            return
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            logger.debug(f"Not caching query result of {size} bytes")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._clock() + self.ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry; counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and the current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+
+    def register_metrics(self) -> None:
+        """Report this cache's hits, misses and hit rate on the /metrics endpoint."""
+        metrics.register_gauge(QUERY_CACHE_HITS, lambda: self.hits)
+        metrics.register_gauge(QUERY_CACHE_MISSES, lambda: self.misses)
+        metrics.register_gauge(QUERY_CACHE_HIT_RATE, lambda: self.stats()["hit_rate"])
+
+    def _remove(self, key: Tuple) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
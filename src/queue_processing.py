@@ -1,44 +1,159 @@
 import sqlite3
 import os
 import logging
+import queue
+import socket
+import threading
+import time
+import uuid
+import hashlib
+import json
+from contextlib import closing, contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
 from pymongo import MongoClient
+from .bulk_writer import BulkWriter
 from .processor import TextTransformer
+from .schema import to_compact
+from .profiling import sampled
+from .metrics import metrics, difference, timer_totals, STAGE_SECONDS, DOCUMENTS_TOTAL, MONGO_SECONDS
+from .config import (
+    BATCH_SIZE, N_PROCESS, QUEUE_WORKERS, QUEUE_CHUNK_SIZE, QUEUE_PREFETCH_WINDOW,
+    QUEUE_LEASE_SECONDS, QUEUE_BUSY_TIMEOUT, OUTPUT_SCHEMA, PIPELINE_VERSION,
+    MONGO_URI, MONGO_TIMEOUT_MS, QUEUE_DB_FILE,
+    PIPELINE_PROFILES, FIELD_COMPONENTS, HTML_CLEANER, HTML_STRIP_TAGS, HTML_MAX_CHARS,
+    PDF_MAX_PAGES, PDF_OCR_DPI, PDF_OCR_MIN_CHARS, LANGUAGE_SAMPLE_SIZE, LANGUAGE_SAMPLE_WINDOWS,
+    LANGUAGE_MIN_LENGTH, LANGUAGE_SEED, NGRAM_SIZES, NGRAM_MIN_FREQUENCY, NGRAM_TOP_K, NGRAM_HASH_IDS
+)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Only the RAW fields TextTransformer.process_document reads
+RAW_DOCUMENT_PROJECTION = {"text": 1, "type": 1, "url": 1}
+
+# Bound on "?" placeholders per statement (older SQLite builds allow 999)
+SQLITE_MAX_VARIABLES = 900
+
 class QueueProcessor:
-    def __init__(self, db_file="doc_id_queue.db", mongo_uri="mongodb://128.113.126.79:27017"):
+    def __init__(self, db_file=QUEUE_DB_FILE, mongo_uri=MONGO_URI,
+                 batch_size=BATCH_SIZE, n_process=N_PROCESS,
+                 workers=QUEUE_WORKERS, chunk_size=QUEUE_CHUNK_SIZE,
+                 prefetch_window=QUEUE_PREFETCH_WINDOW, lease_seconds=QUEUE_LEASE_SECONDS,
+                 output_schema=OUTPUT_SCHEMA, text_transformer=None):
         self.db_file = db_file
         self.mongo_uri = mongo_uri
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.workers = workers
+        # A chunk is one process_documents call, so a smaller one would never fill a batch
+        self.chunk_size = max(chunk_size, batch_size)
+        self.prefetch_window = prefetch_window
+        self.lease_seconds = lease_seconds
+        self.output_schema = output_schema
         self.client = None  # MongoClient is initialized lazily
         self.db = None
         self.collection = None
         self.transformed_collection = None
-        self.text_transformer = TextTransformer()
+        self.text_transformer = text_transformer or TextTransformer()
+        # One connection for enqueueing, shared by every request thread under a lock
+        self._conn = None
+        self._conn_lock = threading.Lock()
 
         if not os.path.exists(self.db_file):
             logging.info(f"Database file {self.db_file} not found. Initializing...")
-            self._init_db()
+        self._init_db()
 
     def _init_db(self):
         """
         Initializes the SQLite database by creating the necessary tables if they don't exist.
+        Queues created before leases existed get the lease columns added.
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self._connect()
         cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS documents (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id TEXT UNIQUE NOT NULL
+                document_id TEXT UNIQUE NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_owner TEXT,
+                lease_expires REAL
             )
         ''')
-        conn.commit()
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(documents)")}
+        if "status" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'")
+        if "lease_owner" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN lease_owner TEXT")
+        if "lease_expires" not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN lease_expires REAL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status, lease_expires)")
         conn.close()
         logging.info("Database initialized.")
 
+    def _connect(self, check_same_thread=True):
+        """
+        Open a connection to the queue database in autocommit mode; multi-statement
+        work is wrapped in explicit transactions. Waits for other consumers' locks.
+        """
+        conn = sqlite3.connect(self.db_file, timeout=QUEUE_BUSY_TIMEOUT, isolation_level=None,
+                               check_same_thread=check_same_thread)
+        conn.execute(f"PRAGMA busy_timeout = {int(QUEUE_BUSY_TIMEOUT * 1000)}")
+        return conn
+
+    def _claim_batch(self, conn, owner, size):
+        """
+        Lease up to `size` queued document IDs to `owner` in one transaction.
+        Pending entries and entries whose lease has expired can be claimed.
+        """
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, document_id FROM documents "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT ?",
+                (now, size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE documents SET status = 'leased', lease_owner = ?, lease_expires = ? WHERE id = ?",
+                [(owner, now + self.lease_seconds, row[0]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [row[1] for row in rows]
+
+    def _claimed_chunks(self, owner):
+        """
+        Yield chunks of document IDs claimed for `owner` until the queue is drained.
+        Uses its own connection, so it can be iterated from the prefetch thread.
+        """
+        conn = self._connect()
+        try:
+            while True:
+                chunk = self._claim_batch(conn, owner, self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            conn.close()
+
+    def _release_leases(self, conn, owner):
+        """Return entries still leased to `owner` to the queue so any consumer can retry them."""
+        released = conn.execute(
+            "UPDATE documents SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+            "WHERE status = 'leased' AND lease_owner = ?",
+            (owner,)
+        ).rowcount
+        if released:
+            logging.info(f"Released {released} unfinished document IDs back to the queue")
+
     def _initialize_mongo(self):
         """Ensure MongoDB client and collections are initialized."""
         if not self.client:
-            self.client = MongoClient(self.mongo_uri)
+            self.client = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
         try:
             self.client.admin.command('ping')  # Test the connection
             self.db = self.client.test
@@ -55,15 +170,31 @@ class QueueProcessor:
             self.client.close()
             self.client = None
 
+    @contextmanager
+    def _shared_connection(self):
+        """
+        Hold the long-lived connection to the queue database, opening it on first use.
+        Enqueueing reuses it instead of connecting per request; Flask's development
+        server runs each request on a new thread, so the connection is shared between
+        threads and used by one at a time.
+        """
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = self._connect(check_same_thread=False)
+            yield self._conn
+
+    def queue_depth(self):
+        """Number of document IDs in the queue, pending or leased."""
+        with self._shared_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
     def add_document_to_db(self, document_id):
         """
         Adds a document ID to the SQLite database.
         """
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO documents (document_id) VALUES (?)", (document_id,))
-            conn.commit()
+            with self._shared_connection() as conn:
+                conn.execute("INSERT INTO documents (document_id) VALUES (?)", (document_id,))
             logging.info(f"Document ID {document_id} added to the database.")
             return True
         except sqlite3.IntegrityError:
@@ -72,93 +203,485 @@ class QueueProcessor:
         except sqlite3.Error as e:
             logging.error(f"SQLite error occurred: {e}")
             return False
-        finally:
-            conn.close()
 
-    def _get_raw_documents(self, docID):
-        """Retrieve a raw document from the MongoDB collection by document ID."""
-        try:
-            document = self.collection.find_one({"_id": docID})
-            if document:
-                logging.info(f"Retrieved document: {document}")
-                return document
+    def add_documents_to_db(self, document_ids):
+        """
+        Adds many document IDs to the SQLite database in one transaction.
+
+        Returns one {"document_id", "status"} dict per input ID, in input order, with
+        status "accepted" for newly queued IDs and "duplicate" for IDs already in the
+        queue or repeated earlier in the same request. On a database error every ID
+        is reported as "error" and nothing is queued.
+        """
+        unique_ids = list(dict.fromkeys(document_ids))
+        with self._shared_connection() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                existing = set()
+                for start in range(0, len(unique_ids), SQLITE_MAX_VARIABLES):
+                    chunk = unique_ids[start:start + SQLITE_MAX_VARIABLES]
+                    placeholders = ", ".join("?" * len(chunk))
+                    existing.update(
+                        row[0] for row in conn.execute(
+                            f"SELECT document_id FROM documents WHERE document_id IN ({placeholders})", chunk
+                        )
+                    )
+                new_ids = [document_id for document_id in unique_ids if document_id not in existing]
+                conn.executemany(
+                    "INSERT OR IGNORE INTO documents (document_id) VALUES (?)",
+                    [(document_id,) for document_id in new_ids]
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                logging.error(f"SQLite error occurred: {e}")
+                return [{"document_id": document_id, "status": "error"} for document_id in document_ids]
+
+        pending = set(new_ids)
+        results = []
+        for document_id in document_ids:
+            if document_id in pending:
+                pending.discard(document_id)
+                results.append({"document_id": document_id, "status": "accepted"})
             else:
-                logging.warning(f"No document found with ID: {docID}")
-                return None
+                results.append({"document_id": document_id, "status": "duplicate"})
+        logging.info(f"Added {len(new_ids)} of {len(document_ids)} document IDs to the database.")
+        return results
+
+    def _get_raw_documents(self, document_ids):
+        """
+        Retrieve raw documents from the MongoDB collection with a single $in query.
+        Returns a dict of document ID -> document; missing IDs are simply absent.
+        """
+        try:
+            documents = fetch_raw_documents(self.collection, document_ids)
+            logging.info(f"Retrieved {len(documents)} of {len(document_ids)} documents")
+            return documents
         except Exception as e:
-            logging.error(f"Error retrieving document with ID {docID}: {e}")
-            return None
+            logging.error(f"Error retrieving documents with IDs {document_ids}: {e}")
+            return {}
+
+    def _prefetch_raw_documents(self, chunks):
+        """
+        Yield (document IDs, documents) for each chunk of document IDs.
+
+        A background thread pulls the chunks and fetches up to prefetch_window of
+        them ahead, so MongoDB reads overlap with NLP work on the current chunk.
+        The thread also closes the chunks generator, which is bound to the SQLite
+        connection it opened there; the caller waits for that before returning.
+        """
+        buffer = queue.Queue(maxsize=self.prefetch_window)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
 
-    def _add_transformed_document(self, docID, transformed_document):
-        """Insert or update a transformed document in the MongoDB collection."""
+        def fetch():
+            try:
+                for chunk in chunks:
+                    if not put((chunk, self._get_raw_documents(chunk))):
+                        return
+            except Exception as e:
+                logging.error(f"Error fetching queued documents: {e}")
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+            put(done)
+
+        thread = threading.Thread(target=fetch, name="raw-document-prefetch", daemon=True)
+        thread.start()
         try:
-            existing_doc = self.transformed_collection.find_one({"doc_id": docID})
+            while True:
+                item = buffer.get()
+                if item is done:
+                    return
+                yield item
+        finally:
+            stop.set()
+            thread.join()
 
-            if existing_doc:
-                self.transformed_collection.update_one(
-                    {"doc_id": docID},
-                    {"$set": transformed_document}
-                )
-                logging.info(f"Updated transformed document with ID: {docID}")
+    def _transform_settings(self, force):
+        """Settings shared by the in-process and worker-process transform paths."""
+        return transform_settings(self.text_transformer, self.output_schema, force, self.batch_size)
+
+    def _handle_results(self, writer, conn, owner, results, summary):
+        """
+        Buffer transformed documents for the bulk write, complete skipped entries
+        right away and count failures, which stay leased until the run ends.
+        """
+        skipped = []
+        for document_id, status, payload in results:
+            if status == "processed":
+                writer.add(payload)
+                summary["transformed"] += 1
+            elif status == "skipped":
+                skipped.append(document_id)
             else:
-                result = self.transformed_collection.insert_one(transformed_document)
-                logging.info(f"Inserted transformed document with ID: {result.inserted_id}")
-        except Exception as e:
-            logging.error(f"Error inserting or updating transformed document: {e}")
+                summary["failed"] += 1
+                logging.warning(f"Failed to process document ID {document_id}: {payload}")
+        if skipped:
+            self._remove_from_queue(conn, owner, skipped)
+            summary["skipped"] += len(skipped)
+            logging.info(f"Skipped {len(skipped)} unchanged documents")
+
+    def _remove_from_queue(self, conn, owner, document_ids):
+        """
+        Delete, in one transaction, document IDs whose transformed documents MongoDB
+        has acknowledged. Entries whose lease has passed to another consumer are kept.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "DELETE FROM documents WHERE document_id = ? AND lease_owner = ?",
+                [(document_id, owner) for document_id in document_ids]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
 
-    def run_queue(self):
+        logging.info(f"Successfully processed and removed {len(document_ids)} document IDs from queue")
+
+    def run_queue(self, workers=None, force=False):
         """
         Process the entire document queue stored in the SQLite database.
         Attempts to retrieve each document from MongoDB and process it.
+
+        Document IDs are claimed in leased batches, so several consumer processes on
+        the same host can drain the queue concurrently. The queue relies on SQLite's
+        WAL mode, which does not work over a network filesystem, so hosts cannot share
+        the database file. Leases
+        of a consumer that crashes expire and become claimable again; entries that
+        failed in this run are released when it ends.
+
+        Documents whose content hash and pipeline fingerprint match their stored
+        transformed document are skipped without running spaCy or writing, unless
+        force is set.
+
+        With more than one worker, chunks of document IDs are handed to a pool of
+        worker processes that fetch and transform them; this process still owns
+        the MongoDB writes and the queue deletions.
+
+        Returns a summary with the number of processed, skipped and failed documents,
+        the run time and throughput, and the seconds spent per processing stage and
+        MongoDB operation (including work done by worker processes).
         """
         if not os.path.exists(self.db_file):
             logging.error("Database file not found. Ensure the queue is initialized.")
             return
 
+        workers = self.workers if workers is None else workers
+        if workers == 1 and self.n_process > 1:
+            # Chunks never use spaCy's own pool, which would start for every chunk and
+            # language group; n_process becomes the number of worker processes instead
+            workers = self.n_process
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        summary = {"processed": 0, "skipped": 0, "failed": 0, "transformed": 0}
+        started = time.perf_counter()
+        metrics_before = metrics.snapshot()
         self._initialize_mongo()
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        conn = self._connect()
+
+        def complete(document_ids):
+            self._remove_from_queue(conn, owner, document_ids)
+            summary["processed"] += len(document_ids)
+
+        chunks = self._claimed_chunks(owner)
         try:
-            # Fetch all document IDs from the database
-            cursor.execute("SELECT document_id FROM documents")
-            rows = cursor.fetchall()
+            # Queue entries are only deleted once their bulk write is acknowledged
+            writer = BulkWriter(self.transformed_collection, key="doc_id", on_flush=complete)
+            with writer:
+                if workers > 1:
+                    self._run_parallel(writer, conn, owner, chunks, workers, summary, force)
+                else:
+                    self._run_serial(writer, conn, owner, chunks, summary, force)
+
+        except Exception as e:
+            logging.error(f"Error while processing the queue: {e}")
+
+        finally:
+            try:
+                chunks.close()  # no-op if the prefetch thread already closed it
+                self._release_leases(conn, owner)
+            finally:
+                conn.close()
+                self._close_mongo()
 
-            if not rows:
-                logging.info("No documents in the queue to process.")
+        # Transformed documents whose bulk write was not acknowledged also failed
+        summary["failed"] += summary.pop("transformed") - summary["processed"]
+        for outcome in ("processed", "skipped", "failed"):
+            if summary[outcome]:
+                metrics.increment(DOCUMENTS_TOTAL, summary[outcome], outcome=outcome)
 
-            for row in rows:
-                document_id = row[0]
-                logging.info(f"Processing document ID: {document_id}")
+        elapsed = time.perf_counter() - started
+        run_metrics = difference(metrics.snapshot(), metrics_before)
+        summary["elapsed_seconds"] = elapsed
+        summary["docs_per_second"] = (summary["processed"] + summary["skipped"]) / elapsed if elapsed else 0.0
+        summary["stage_seconds"] = timer_totals(run_metrics, STAGE_SECONDS, "stage")
+        summary["mongo_seconds"] = timer_totals(run_metrics, MONGO_SECONDS, "operation")
+        logging.info(f"Queue run summary: {summary}")
+        return summary
 
-                # Attempt to retrieve the document from MongoDB
-                document = self._get_raw_documents(document_id)
-                if document:
+    def _run_serial(self, writer, conn, owner, chunks, summary, force):
+        """Process queued documents in this process, one prefetched chunk at a time."""
+        settings = self._transform_settings(force)
+        # Closed right away if this run aborts, so the prefetch thread stops before leases are released
+        with closing(self._prefetch_raw_documents(chunks)) as prefetched:
+            for chunk, raw_documents in prefetched:
+                results = transform_chunk(
+                    self.text_transformer, self.transformed_collection, chunk, raw_documents, settings
+                )
+                self._handle_results(writer, conn, owner, results, summary)
+                # A chunk of skipped or failed documents adds nothing that would flush by interval
+                writer.flush_if_due()
+
+    def _run_parallel(self, writer, conn, owner, chunks, workers, summary, force):
+        """
+        Process queued documents in a pool of worker processes.
+
+        At most two chunks per worker are in flight at a time, refilled as each
+        one finishes. If a worker raises or dies, the documents of its chunk
+        count as failed and stay in the queue for the next run; only a broken
+        pool stops scheduling. Workers rebuild the transformer with this one's model routing
+        and chunking, so they produce the same results as a serial run.
+        """
+        chunks = iter(chunks)
+        transformer = self.text_transformer
+        transformer_config = {
+            "model_name": transformer.model_name,
+            "profile": transformer.profile,
+            "language_models": transformer.language_models,
+            "chunk_threshold": transformer.chunk_threshold,
+            "chunk_size": transformer.chunk_size
+        }
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.mongo_uri, transformer_config, self._transform_settings(force))
+        ) as executor:
+            in_flight = {}
+            for chunk in islice(chunks, workers * 2):
+                in_flight[executor.submit(_process_chunk, chunk)] = chunk
+
+            broken = False
+            while in_flight:
+                # Wake up at least every max_interval to flush results buffered while workers are busy
+                done, _ = wait(in_flight, timeout=writer.max_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = in_flight.pop(future)
                     try:
-                        transformed_content, metadata = self.text_transformer.process_document(document)
-                        transformed_document = {
-                            "url": document.get("url", ""),
-                            "doc_id": document_id,
-                            "text": transformed_content,
-                            "metadata": metadata
-                        }
-                        self._add_transformed_document(document_id, transformed_document)
-
-                        # Delete the document ID from the SQLite queue
-                        cursor.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
-                        conn.commit()
-
-                        logging.info(f"Successfully processed and removed document ID: {document_id} from queue")
+                        results, worker_metrics = future.result()
+                    except BrokenProcessPool as e:
+                        logging.error(f"Worker pool is broken, stopping this run: {e}")
+                        summary["failed"] += len(chunk)
+                        broken = True
                     except Exception as e:
-                        logging.error(f"Error processing document ID {document_id}: {e}")
-                else:
-                    logging.warning(f"Failed to process document ID: {document_id}")
+                        logging.error(f"Worker failed on chunk {chunk}, leaving it queued: {e}")
+                        summary["failed"] += len(chunk)
+                    else:
+                        metrics.merge(worker_metrics)
+                        try:
+                            self._handle_results(writer, conn, owner, results, summary)
+                        except Exception as e:
+                            logging.error(f"Error storing results of chunk {chunk}: {e}")
+
+                    # Refill after every finished chunk, failed or not; only a broken
+                    # pool stops scheduling, and whatever was not stored stays queued
+                    next_chunk = None if broken else next(chunks, None)
+                    if next_chunk is None:
+                        continue
+                    try:
+                        in_flight[executor.submit(_process_chunk, next_chunk)] = next_chunk
+                    except BrokenProcessPool as e:
+                        logging.error(f"Worker pool is broken, stopping this run: {e}")
+                        broken = True
+                writer.flush_if_due()
+
+
+def fetch_raw_documents(collection, document_ids):
+    """Fetch the fields process_document needs for many documents in one query."""
+    with metrics.timer(MONGO_SECONDS, operation="read_raw"):
+        cursor = collection.find({"_id": {"$in": list(document_ids)}}, RAW_DOCUMENT_PROJECTION)
+        return {document["_id"]: document for document in cursor}
+
+
+def output_settings(transformer):
+    """The settings, besides the models and the profile, that shape a transformed document."""
+    return {
+        "profiles": PIPELINE_PROFILES,
+        "field_components": FIELD_COMPONENTS,
+        "chunking": [transformer.chunk_threshold, transformer.chunk_size],
+        "html": [HTML_CLEANER, HTML_STRIP_TAGS, HTML_MAX_CHARS],
+        "pdf": [PDF_MAX_PAGES, PDF_OCR_DPI, PDF_OCR_MIN_CHARS],
+        "language": [LANGUAGE_SAMPLE_SIZE, LANGUAGE_SAMPLE_WINDOWS, LANGUAGE_MIN_LENGTH, LANGUAGE_SEED],
+        "ngrams": [NGRAM_SIZES, NGRAM_MIN_FREQUENCY, NGRAM_TOP_K, NGRAM_HASH_IDS]
+    }
 
+
+def pipeline_fingerprint(transformer, output_schema):
+    """
+    Identify everything besides the raw content that shapes a stored result: the
+    code (PIPELINE_VERSION), the models and profile, the output schema and a digest
+    of the output settings, so changing any of those reprocesses stored documents.
+    """
+    settings = json.dumps(output_settings(transformer), sort_keys=True)
+    digest = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:12]
+    return f"{PIPELINE_VERSION}:{transformer.fingerprint()}:{output_schema}:{digest}"
+
+
+def transform_settings(transformer, output_schema, force, batch_size):
+    """
+    Settings for transform_chunk. The queue and the src/api.py drain both build
+    them here, so they store the same fingerprint.
+    """
+    return {
+        "fingerprint": pipeline_fingerprint(transformer, output_schema),
+        "force": force,
+        "output_schema": output_schema,
+        "batch_size": batch_size
+    }
+
+
+def build_transformed_document(document_id, document, processed_result, content_hash, settings):
+    """Build the TRANSFORMED record for a processed raw document."""
+    if settings["output_schema"] == "compact":
+        processed_result = to_compact(processed_result)
+    return {
+        "url": document.get("url", ""),
+        "doc_id": document_id,
+        "text": processed_result,
+        "metadata": {"processed": True},
+        "content_hash": content_hash,
+        "pipeline_fingerprint": settings["fingerprint"]
+    }
+
+
+def _unchanged_document_ids(transformed_collection, hashes, fingerprint):
+    """Return the IDs whose stored transformed document has the same hash and fingerprint."""
+    with metrics.timer(MONGO_SECONDS, operation="read_transformed"):
+        stored = list(transformed_collection.find(
+            {"doc_id": {"$in": list(hashes)}},
+            {"doc_id": 1, "content_hash": 1, "pipeline_fingerprint": 1}
+        ))
+    return {
+        document["doc_id"] for document in stored
+        if document.get("pipeline_fingerprint") == fingerprint
+        and document.get("content_hash") == hashes.get(document["doc_id"])
+    }
+
+
+@sampled("queue_chunk", lambda transformer, transformed_collection, chunk, raw_documents, settings: {
+    "document_ids": list(chunk),
+    "size": sum(len(document.get('text') or "") for document in raw_documents.values())
+})
+def transform_chunk(transformer, transformed_collection, chunk, raw_documents, settings):
+    """
+    Transform a chunk of queued documents, skipping the unchanged ones.
+
+    Returns one (document_id, status, payload) tuple per ID: ("processed",
+    transformed document to write), ("skipped", None) or ("failed", reason).
+    Nothing is written here; callers upsert the transformed documents by doc_id.
+    """
+    results = []
+    documents = []
+    hashes = {}
+    for document_id in chunk:
+        document = raw_documents.get(document_id)
+        if not document:
+            results.append((document_id, "failed", "no document found"))
+            continue
+        # A malformed document (e.g. null text) fails on its own
+        try:
+            hashes[document_id] = transformer.content_hash(document)
         except Exception as e:
-            logging.error(f"Error while processing the queue: {e}")
+            results.append((document_id, "failed", f"hashing failed: {e}"))
+            continue
+        documents.append((document_id, document))
 
-        finally:
-            conn.close()
-            self._close_mongo()
+    if documents and not settings["force"]:
+        try:
+            unchanged = _unchanged_document_ids(transformed_collection, hashes, settings["fingerprint"])
+        except Exception as e:
+            logging.error(f"Error checking for unchanged documents, processing all: {e}")
+            unchanged = set()
+        results.extend((document_id, "skipped", None) for document_id in unchanged)
+        documents = [(document_id, document) for document_id, document in documents if document_id not in unchanged]
+
+    # Run the documents through the transformer in batches. Parallelism comes from the
+    # queue's worker processes, not from a spaCy pool started for each chunk
+    done = 0
+    try:
+        processed = transformer.process_documents(
+            (document for _, document in documents),
+            batch_size=settings["batch_size"],
+            n_process=1
+        )
+        for (document_id, document), processed_result in zip(documents, processed):
+            transformed_document = build_transformed_document(
+                document_id, document, processed_result, hashes[document_id], settings
+            )
+            results.append((document_id, "processed", transformed_document))
+            done += 1
+    except Exception as e:
+        # Fall back to one document at a time, so a bad document only fails itself
+        logging.warning(f"Batch of {len(documents) - done} documents failed, processing them one by one: {e}")
+        for document_id, document in documents[done:]:
+            try:
+                transformed_document = build_transformed_document(
+                    document_id, document, transformer.process_document(document), hashes[document_id], settings
+                )
+            except Exception as document_error:
+                results.append((document_id, "failed", f"processing failed: {document_error}"))
+                continue
+            results.append((document_id, "processed", transformed_document))
+    return results
+
+
+# Per-process state for run_queue worker processes, set up by _init_worker
+_worker_transformer = None
+_worker_client = None
+_worker_settings = None
+
+
+def _init_worker(mongo_uri, transformer_config, settings):
+    """Load the model and open a MongoDB client once per worker process."""
+    global _worker_transformer, _worker_client, _worker_settings
+    _worker_transformer = TextTransformer(
+        transformer_config["model_name"], transformer_config["profile"], transformer_config["language_models"]
+    )
+    _worker_transformer.chunk_threshold = transformer_config["chunk_threshold"]
+    _worker_transformer.chunk_size = transformer_config["chunk_size"]
+    _worker_transformer.warm_up([transformer_config["profile"]])
+    _worker_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
+    _worker_settings = settings
+
+
+def _process_chunk(document_ids):
+    """
+    Fetch and transform a chunk of documents inside a worker process.
+
+    Returns the (document_id, status, payload) tuples of transform_chunk and
+    the metrics recorded for the chunk, which the parent merges into its own.
+    Nothing is written here; the parent stores the results and updates the queue.
+    """
+    before = metrics.snapshot()
+    try:
+        raw_documents = fetch_raw_documents(_worker_client.test.RAW, document_ids)
+    except Exception as e:
+        results = [(document_id, "failed", f"retrieval failed: {e}") for document_id in document_ids]
+    else:
+        results = transform_chunk(
+            _worker_transformer, _worker_client.test.TRANSFORMED, document_ids, raw_documents, _worker_settings
+        )
+    return results, difference(metrics.snapshot(), before)
 
 # Example usage:
 """
@@ -0,0 +1,156 @@
+from typing import Any, Dict, Iterable, List
+
+from .config import NGRAM_SIZES
+from .utils import ngram_field, ngram_name
+
+# Version written into compact results; expanded results carry no version
+COMPACT_SCHEMA_VERSION = 2
+
+NGRAM_FIELDS = {ngram_field(n): ngram_name(n) for n in set(NGRAM_SIZES) | {2, 3}}
+
+
+def to_compact(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a process_document result to the compact postings schema.
+
+    Tokens become one entry per lemma with its frequency and a packed position
+    array (varint-encoded deltas); n-grams (with their IDs, if any), named
+    entities and parts of speech become parallel arrays, with POS tags stored as
+    one byte each against a tag table. Fields missing from the result stay missing.
+    """
+    compact = {"schema_version": COMPACT_SCHEMA_VERSION}
+    for key, value in result.items():
+        if key == "tokens":
+            compact[key] = _compact_tokens(value)
+        elif key in NGRAM_FIELDS:
+            item_key = NGRAM_FIELDS[key]
+            compact[key] = {
+                "ngram": [entry[item_key] for entry in value],
+                "frequency": [entry["frequency"] for entry in value]
+            }
+            if value and "id" in value[0]:
+                compact[key]["id"] = [entry["id"] for entry in value]
+        elif key == "named_entities":
+            compact[key] = {
+                "entity": [entry["entity"] for entry in value],
+                "type": [entry["type"] for entry in value],
+                "start": [entry["position"][0] for entry in value],
+                "end": [entry["position"][1] for entry in value]
+            }
+        elif key == "parts_of_speech":
+            tags = sorted({entry["pos_tag"] for entry in value})
+            tag_ids = {tag: i for i, tag in enumerate(tags)}
+            compact[key] = {
+                "tags": tags,
+                "token": [entry["token"] for entry in value],
+                "pos_tag": bytes(tag_ids[entry["pos_tag"]] for entry in value),
+                "position": pack_positions(entry["position"] for entry in value)
+            }
+        else:
+            compact[key] = value
+    return compact
+
+
+def from_compact(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a compact result back to the expanded schema readers of the old
+    format expect. Results that are already expanded are returned unchanged.
+    """
+    if "schema_version" not in result:
+        return result
+    if result["schema_version"] != COMPACT_SCHEMA_VERSION:
+        raise ValueError(f"Unsupported schema version: {result['schema_version']}")
+
+    expanded = {}
+    for key, value in result.items():
+        if key == "schema_version":
+            continue
+        if key == "tokens":
+            expanded[key] = _expand_tokens(value)
+        elif key in NGRAM_FIELDS:
+            item_key = NGRAM_FIELDS[key]
+            expanded[key] = [
+                {item_key: list(ngram), "frequency": frequency}
+                for ngram, frequency in zip(value["ngram"], value["frequency"])
+            ]
+            for entry, ngram_id in zip(expanded[key], value.get("id", [])):
+                entry["id"] = ngram_id
+        elif key == "named_entities":
+            expanded[key] = [
+                {"entity": entity, "type": entity_type, "position": [start, end]}
+                for entity, entity_type, start, end in zip(value["entity"], value["type"], value["start"], value["end"])
+            ]
+        elif key == "parts_of_speech":
+            tags = value["tags"]
+            expanded[key] = [
+                {"token": token, "pos_tag": tags[tag_id], "position": position}
+                for token, tag_id, position in zip(value["token"], value["pos_tag"], unpack_positions(value["position"]))
+            ]
+        else:
+            expanded[key] = value
+    return expanded
+
+
+def pack_positions(positions: Iterable[int]) -> bytes:
+    """Pack ascending character positions as varint-encoded deltas."""
+    packed = bytearray()
+    previous = 0
+    for position in positions:
+        delta = position - previous
+        previous = position
+        while delta >= 0x80:
+            packed.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        packed.append(delta)
+    return bytes(packed)
+
+
+def unpack_positions(packed: bytes) -> List[int]:
+    """Inverse of pack_positions."""
+    positions = []
+    previous = 0
+    delta = 0
+    shift = 0
+    for byte in packed:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += delta
+        positions.append(previous)
+        delta = 0
+        shift = 0
+    return positions
+
+
+def _compact_tokens(tokens: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Group the per-occurrence token entries (contiguous per lemma) into postings."""
+    lemmas = []
+    frequencies = []
+    postings = []
+    positions = []
+    for entry in tokens:
+        if not lemmas or entry["lemma"] != lemmas[-1]:
+            if lemmas:
+                postings.append(pack_positions(positions))
+            lemmas.append(entry["lemma"])
+            frequencies.append(entry["frequency"])
+            positions = []
+        positions.append(entry["position"])
+    if lemmas:
+        postings.append(pack_positions(positions))
+    return {"lemma": lemmas, "frequency": frequencies, "positions": postings}
+
+
+def _expand_tokens(tokens: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand postings back into one entry per occurrence."""
+    expanded = []
+    for lemma, frequency, packed in zip(tokens["lemma"], tokens["frequency"], tokens["positions"]):
+        for position in unpack_positions(packed):
+            expanded.append({
+                "token": lemma,
+                "lemma": lemma,
+                "frequency": frequency,
+                "position": position
+            })
+    return expanded
@@ -0,0 +1,72 @@
+import hashlib
+import heapq
+from collections import Counter
+from itertools import islice
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from .config import NGRAM_SIZES
+
+NGRAM_NAMES = {1: "unigram", 2: "bigram", 3: "trigram"}
+
+
+def ngram_name(n: int) -> str:
+    """Singular name of an n-gram order: "bigram", "trigram", "4gram", ..."""
+    return NGRAM_NAMES.get(n, f"{n}gram")
+
+
+def ngram_field(n: int) -> str:
+    """Result field holding the n-grams of an order: "bigrams", "trigrams", ..."""
+    return ngram_name(n) + "s"
+
+
+def count_ngrams(tokens: Sequence[str], sizes: Iterable[int] = NGRAM_SIZES) -> Dict[int, Counter]:
+    """
+    Count the n-grams of every order in sizes. Each order is one sliding window
+    over the same token list; the windows are iterators, so the list is never copied.
+    """
+    return {
+        n: Counter(zip(*[islice(tokens, i, None) for i in range(n)]))
+        for n in sizes
+    }
+
+
+def top_ngrams(counts: Counter, min_frequency: int = 1, top_k: int = 0) -> List[Tuple[Tuple[str, ...], int]]:
+    """
+    Return (ngram, frequency) pairs sorted by descending frequency, then n-gram.
+    N-grams rarer than min_frequency are dropped; a positive top_k keeps only
+    the top_k most frequent.
+    """
+    items = counts.items()
+    if min_frequency > 1:
+        items = [(ngram, frequency) for ngram, frequency in items if frequency >= min_frequency]
+    order = lambda item: (-item[1], item[0])
+    if 0 < top_k < len(items):
+        return heapq.nsmallest(top_k, items, key=order)
+    return sorted(items, key=order)
+
+
+def ngram_id(ngram: Sequence[str]) -> int:
+    """Stable signed 64-bit ID of an n-gram, the same in every process and run."""
+    digest = hashlib.blake2b("\x1f".join(ngram).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def extract_ngrams(tokens: Sequence[str], sizes: Iterable[int] = NGRAM_SIZES, min_frequency: int = 1,
+                   top_k: int = 0, hashed_ids: bool = False) -> Dict[str, List[Dict[str, object]]]:
+    """
+    Build the n-gram fields of a result ("bigrams", "trigrams", ...) from a
+    token list: one {"<name>": [tokens], "frequency": count} entry per n-gram,
+    pruned and sorted as in top_ngrams, with an "id" (see ngram_id) when
+    hashed_ids is set.
+    """
+    fields = {}
+    for n, counts in count_ngrams(tokens, sizes).items():
+        name = ngram_name(n)
+        entries = []
+        for ngram, frequency in top_ngrams(counts, min_frequency, top_k):
+            entry = {name: list(ngram), "frequency": frequency}
+            if hashed_ids:
+                entry["id"] = ngram_id(ngram)
+            entries.append(entry)
+        fields[ngram_field(n)] = entries
+    return fields
@@ -17,6 +17,17 @@ class TestTextTransformationAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("added to processing queue", response.json()["message"])
 
+    def test_new_documents(self):
+        """Test adding a batch of documents to the queue"""
+        url = f"{self.base_url}/newDocuments"
+        data = {"document_ids": ["doc201", "doc202", "doc201"]}
+        response = requests.post(url, json=data, timeout=5)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(len(result["results"]), 3)
+        self.assertEqual(result["results"][2]["status"], "duplicate")
+        self.assertEqual(result["accepted"] + result["duplicate"], 3)
+
     # def test_add_transformed_document(self):
     #     """Test adding a transformed document"""
     #     url = f"{self.base_url}/addTransformedDocument"
@@ -45,6 +56,14 @@ class TestTextTransformationAPI(unittest.TestCase):
         print("\nResponse from /transformQuery endpoint:")
         print(json.dumps(result, indent=4))  # Pretty-print JSON response
 
+    def test_health_endpoints(self):
+        """Liveness always answers; readiness reports whether the models are warm."""
+        response = requests.get(f"{self.base_url}/healthz", timeout=5)
+        self.assertEqual(response.status_code, 200)
+        response = requests.get(f"{self.base_url}/readyz", timeout=5)
+        self.assertIn(response.status_code, (200, 503))
+        self.assertEqual(response.json()["ready"], response.status_code == 200)
+
     # def test_get_raw_documents(self):
     #     """Test retrieving raw documents"""
     #     url = f"{self.base_url}/getRawDocuments"
@@ -0,0 +1,62 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from pymongo.errors import BulkWriteError
+from src.bulk_writer import BulkWriter
+
+class FakeCollection:
+    """Records bulk_write calls; optionally fails the operations at the given indexes."""
+    def __init__(self, failing_indexes=()):
+        self.batches = []
+        self.failing_indexes = failing_indexes
+
+    def bulk_write(self, operations, ordered=True):
+        self.batches.append(operations)
+        if self.failing_indexes:
+            raise BulkWriteError({
+                "writeErrors": [{"index": i, "errmsg": "duplicate key"} for i in self.failing_indexes]
+            })
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestBulkWriter(unittest.TestCase):
+    def test_flushes_by_count_and_acknowledges_keys(self):
+        collection = FakeCollection()
+        acknowledged = []
+        writer = BulkWriter(collection, max_documents=2, max_bytes=10 ** 6, max_interval=60,
+                            on_flush=acknowledged.extend)
+        writer.add({"doc_id": "a", "text": {}})
+        self.assertEqual(collection.batches, [])
+        writer.add({"doc_id": "b", "text": {}})
+        self.assertEqual(len(collection.batches), 1)
+        self.assertEqual(acknowledged, ["a", "b"])
+
+    def test_flushes_by_size_and_time(self):
+        clock = FakeClock()
+        collection = FakeCollection()
+        writer = BulkWriter(collection, max_documents=100, max_bytes=100, max_interval=5, clock=clock)
+        writer.add({"doc_id": "big", "text": "x" * 200})
+        self.assertEqual(len(collection.batches), 1)
+
+        writer.add({"doc_id": "a"})
+        self.assertEqual(writer.flush_if_due(), [])
+        clock.now = 6
+        self.assertEqual(writer.flush_if_due(), ["a"])
+
+    def test_failed_writes_are_not_acknowledged(self):
+        collection = FakeCollection(failing_indexes=[1])
+        acknowledged = []
+        with BulkWriter(collection, max_documents=100, on_flush=acknowledged.extend) as writer:
+            for doc_id in ["a", "b", "c"]:
+                writer.add({"doc_id": doc_id})
+        self.assertEqual(acknowledged, ["a", "c"])
+
+if __name__ == "__main__":
+    unittest.main()
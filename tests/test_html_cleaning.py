@@ -0,0 +1,52 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src.html_cleaning import clean_html
+
+PAGE = (
+    '<html><head><title>News</title><style>p { color: red; }</style>'
+    '<script>var tracking = "</p>";</script></head>'
+    '<body><nav><a href="/">Home</a> <a href="/world">World</a></nav>'
+    '<!-- comment --><p>Hello &amp; <b>World</b></p><br/><img src="x.png">More text'
+    '<footer>Copyright</footer></body></html>'
+)
+
+class TestHtmlCleaning(unittest.TestCase):
+    def test_boilerplate_is_stripped(self):
+        self.assertEqual(clean_html(PAGE, backend="parser"), "News Hello & World More text")
+
+    def test_parser_matches_bs4_without_boilerplate_tags(self):
+        strip_tags = ['script', 'style']
+        for html in (PAGE, '<div>unclosed <p>one<p>two &copy; 2024<td>cell</div>', 'plain text', ''):
+            self.assertEqual(
+                clean_html(html, backend="parser", strip_tags=strip_tags),
+                clean_html(html, backend="bs4", strip_tags=strip_tags)
+            )
+
+    def test_unclosed_strip_tags_keep_the_rest_of_the_page(self):
+        # Strip elements that are never closed are stray tags: their text is kept, as bs4 keeps it
+        for html in (
+            '<p>x<aside>side</p>rest',
+            '<nav>menu<p>unclosed',
+            '<div><footer>a<div>b</div>c</div>d',
+            '<body><p>one<svg><circle r="1">two</p><p>three</p></body>',
+            '<ul><li>item<nav>links</ul><p>after &amp; more'
+        ):
+            self.assertEqual(clean_html(html, backend="parser"), clean_html(html, backend="bs4"))
+
+    def test_closed_strip_tags_inside_malformed_html_are_dropped(self):
+        html = '<div><p>intro<nav>menu</nav>body<p>more</div><aside>side</aside>end'
+        self.assertEqual(clean_html(html, backend="parser"), "intro body more end")
+
+    def test_large_pages_are_bounded(self):
+        html = '<p>word</p>' * 1000
+        self.assertEqual(clean_html(html, backend="parser", max_chars=110), " ".join(["word"] * 10))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            clean_html(PAGE, backend="missing")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import sys
+import os
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src.jobs import JobManager
+
+class TestJobManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = JobManager(max_workers=2, max_history=2)
+
+    def tearDown(self):
+        self.manager.shutdown()
+
+    def test_job_reports_progress(self):
+        release = threading.Event()
+
+        def drain(job):
+            job.total = 4
+            job.processed = 2
+            job.failed = 1
+            release.wait(5)
+            job.skipped = 1
+
+        job, created = self.manager.start("drain", drain)
+        self.assertTrue(created)
+        release.set()
+        self.manager.wait(job, timeout=5)
+
+        status = self.manager.get(job.id).status()
+        self.assertEqual(status["status"], "succeeded")
+        self.assertEqual((status["processed"], status["skipped"], status["failed"]), (2, 1, 1))
+        self.assertEqual(status["remaining"], 0)
+
+    def test_concurrent_starts_are_coalesced(self):
+        release = threading.Event()
+        first, created = self.manager.start("drain", lambda job: release.wait(5))
+        second, created_again = self.manager.start("drain", lambda job: None)
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertIs(first, second)
+
+        release.set()
+        self.manager.wait(first, timeout=5)
+        third, created = self.manager.start("drain", lambda job: None)
+        self.assertTrue(created)
+        self.assertIsNot(third, first)
+
+    def test_failed_job_records_error(self):
+        def fail(job):
+            raise RuntimeError("mongo unavailable")
+
+        job, _ = self.manager.start("drain", fail)
+        self.manager.wait(job, timeout=5)
+        self.assertEqual(job.status()["status"], "failed")
+        self.assertEqual(job.status()["error"], "mongo unavailable")
+
+    def test_old_jobs_are_forgotten(self):
+        jobs = []
+        for _ in range(3):
+            job, _ = self.manager.start("drain", lambda job: None)
+            jobs.append(self.manager.wait(job, timeout=5))
+        self.assertIsNone(self.manager.get(jobs[0].id))
+        self.assertIs(self.manager.get(jobs[2].id), jobs[2])
+
+if __name__ == "__main__":
+    unittest.main()
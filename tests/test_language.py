@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src.language import detect_language, sample_text
+from src.config import LANGUAGE_SAMPLE_SIZE
+
+class TestLanguageDetection(unittest.TestCase):
+    def test_detection_is_deterministic(self):
+        text = "The quick brown fox jumps over the lazy dog near the river bank."
+        results = {detect_language(text) for _ in range(10)}
+        self.assertEqual(results, {'en'})
+
+    def test_short_content_is_unknown(self):
+        self.assertEqual(detect_language("   too short  "), 'unknown')
+        self.assertEqual(detect_language("12345 67890 12345 67890 !!!"), 'unknown')
+
+    def test_sample_is_bounded(self):
+        text = "word " * 100000
+        sample = sample_text(text)
+        self.assertLessEqual(len(sample), LANGUAGE_SAMPLE_SIZE + 2)
+        self.assertEqual(sample_text("short text"), "short text")
+
+    def test_sample_covers_the_whole_text(self):
+        text = "header " * 10000 + "middle " * 10000 + "footer " * 10000
+        sample = sample_text(text)
+        for word in ("header", "middle", "footer"):
+            self.assertIn(word, sample)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src.metrics import Metrics, difference, timer_totals, STAGE_SECONDS, DOCUMENTS_TOTAL, QUEUE_DEPTH
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_render_prometheus_text(self):
+        self.metrics.increment(DOCUMENTS_TOTAL, 3, outcome="processed")
+        self.metrics.observe(STAGE_SECONDS, 0.5, stage="spacy")
+        with self.metrics.timer(STAGE_SECONDS, stage="spacy"):
+            pass
+        self.metrics.register_gauge(QUEUE_DEPTH, lambda: 7)
+
+        text = self.metrics.render()
+        self.assertIn("# TYPE text_transformer_documents_total counter", text)
+        self.assertIn('text_transformer_documents_total{outcome="processed"} 3', text)
+        self.assertIn('text_transformer_stage_seconds_count{stage="spacy"} 2', text)
+        self.assertIn("text_transformer_queue_depth 7", text)
+
+    def test_label_values_are_escaped(self):
+        self.metrics.increment(DOCUMENTS_TOTAL, outcome='say "hi"\n')
+        self.assertIn('{outcome="say \\"hi\\"\\n"}', self.metrics.render())
+
+    def test_failing_gauge_is_skipped(self):
+        self.metrics.register_gauge(QUEUE_DEPTH, lambda: 1 / 0)
+        self.assertNotIn("queue_depth", self.metrics.render())
+
+    def test_snapshots_subtract_and_merge(self):
+        self.metrics.observe(STAGE_SECONDS, 1.0, stage="spacy")
+        before = self.metrics.snapshot()
+        self.metrics.observe(STAGE_SECONDS, 2.0, stage="spacy")
+        self.metrics.observe(STAGE_SECONDS, 0.5, stage="ngrams")
+        delta = difference(self.metrics.snapshot(), before)
+        self.assertEqual(timer_totals(delta, STAGE_SECONDS, "stage"), {"spacy": 2.0, "ngrams": 0.5})
+
+        other = Metrics()
+        other.merge(delta)
+        other.merge(delta)
+        self.assertEqual(timer_totals(other.snapshot(), STAGE_SECONDS, "stage"), {"spacy": 4.0, "ngrams": 1.0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import sys
+import os
+import subprocess
+import threading
+from unittest import mock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src import model_registry
+from src.processor import TextTransformer
+
+class TestModelRegistry(unittest.TestCase):
+    def tearDown(self):
+        model_registry.unload()
+
+    def test_transformers_share_pipeline(self):
+        first = TextTransformer()
+        second = TextTransformer()
+        self.assertIs(first.nlp, second.nlp)
+
+    def test_transformer_loads_nothing_until_warm_up(self):
+        transformer = TextTransformer()
+        self.assertEqual(model_registry.loaded_pipelines(), [])
+        transformer.warm_up()
+        self.assertIn((transformer.model_name, transformer.profile), model_registry.loaded_pipelines())
+
+    def test_import_does_not_load_heavy_dependencies(self):
+        code = ("import sys, src.processor, src.queue_processing; "
+                "print(sorted(m for m in ('spacy', 'bs4', 'pdfreader', 'pdf2image', 'pytesseract') if m in sys.modules))")
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "[]")
+
+    def test_concurrent_loads_happen_once(self):
+        pipelines = []
+        threads = [
+            threading.Thread(target=lambda: pipelines.append(model_registry.get_pipeline("en_core_web_sm", "query")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(pipeline is pipelines[0] for pipeline in pipelines))
+
+    def test_warm_up_and_unload(self):
+        model_registry.warm_up(profiles=["full", "index"])
+        self.assertIn(("en_core_web_sm", "index"), model_registry.loaded_pipelines())
+
+        model_registry.unload(profile="index")
+        self.assertNotIn(("en_core_web_sm", "index"), model_registry.loaded_pipelines())
+        self.assertIn(("en_core_web_sm", "full"), model_registry.loaded_pipelines())
+
+    def test_least_recently_used_model_is_evicted(self):
+        with mock.patch.object(model_registry, "_load_model", side_effect=lambda name, **kwargs: object()), \
+                mock.patch.object(model_registry, "max_resident_models", 2):
+            english = model_registry.get_pipeline("en_model", "full")
+            model_registry.get_pipeline("de_model", "full")
+            model_registry.get_pipeline("en_model", "full")
+            model_registry.get_pipeline("fr_model", "full")
+
+            loaded = model_registry.loaded_pipelines()
+            self.assertEqual(sorted(loaded), [("en_model", "full"), ("fr_model", "full")])
+            self.assertIs(model_registry.get_pipeline("en_model", "full"), english)
+
+if __name__ == "__main__":
+    unittest.main()
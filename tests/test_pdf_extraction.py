@@ -0,0 +1,114 @@
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src import pdf_extraction
+
+PAGES = ["Text layer of page one", "", "Text layer of page three", "  7  "]
+
+class TestPdfExtraction(unittest.TestCase):
+    def setUp(self):
+        self.ocr_calls = []
+
+        def text_layer_pages(file_path, max_pages, deadline):
+            return iter(PAGES[:max_pages])
+
+        def ocr_page(file_path, page_number, dpi=None):
+            self.ocr_calls.append(page_number)
+            time.sleep(0.01)
+            return f"OCR text of page {page_number}"
+
+        patches = [
+            mock.patch.object(pdf_extraction, "_text_layer_pages", text_layer_pages),
+            mock.patch.object(pdf_extraction, "_ocr_page", ocr_page)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_only_pages_without_text_are_ocred(self):
+        text = pdf_extraction.extract_pdf_text("scan.pdf", ocr_workers=1)
+        self.assertEqual(self.ocr_calls, [2, 4])
+        self.assertEqual(text, "\n\n".join([
+            "Text layer of page one", "OCR text of page 2", "Text layer of page three", "OCR text of page 4"
+        ]))
+
+    def test_page_limit(self):
+        text = pdf_extraction.extract_pdf_text("scan.pdf", max_pages=2, ocr_workers=1)
+        self.assertEqual(self.ocr_calls, [2])
+        self.assertEqual(text, "Text layer of page one\n\nOCR text of page 2")
+
+    def test_time_budget_skips_remaining_ocr(self):
+        text = pdf_extraction.extract_pdf_text("scan.pdf", time_budget=-1, ocr_workers=1)
+        self.assertEqual(self.ocr_calls, [])
+        self.assertEqual(text, "Text layer of page one\n\nText layer of page three\n\n7")
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Thread pool standing in for the OCR process pool, so a mocked page OCR runs in it."""
+    instances = []
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers)
+        self.submitted = []
+        CountingExecutor.instances.append(self)
+
+    def submit(self, fn, *args):
+        self.submitted.append(args[1])
+        return super().submit(fn, *args)
+
+class TestParallelOcr(unittest.TestCase):
+    def setUp(self):
+        CountingExecutor.instances = []
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+        def safe_ocr_page(file_path, page_number):
+            if page_number == 7:
+                self.release.wait()
+            else:
+                time.sleep(0.05)
+            return f"OCR text of page {page_number}"
+
+        patches = [
+            mock.patch.object(pdf_extraction, "ProcessPoolExecutor", CountingExecutor),
+            mock.patch.object(pdf_extraction, "_safe_ocr_page", safe_ocr_page)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_results_of_all_workers_are_yielded(self):
+        pages = dict(pdf_extraction._ocr_pages("scan.pdf", [1, 2, 3, 4, 5, 6], time.monotonic() + 10, 3))
+        self.assertEqual(pages, {number: f"OCR text of page {number}" for number in range(1, 7)})
+        self.assertEqual(CountingExecutor.instances[0]._max_workers, 3)
+
+    def test_at_most_two_pages_per_worker_are_in_flight(self):
+        ocr = pdf_extraction._ocr_pages("scan.pdf", list(range(1, 7)) + list(range(8, 21)), time.monotonic() + 10, 2)
+        yielded = 0
+        for _ in ocr:
+            yielded += 1
+            self.assertLessEqual(len(CountingExecutor.instances[0].submitted) - yielded, 4)
+        self.assertEqual(yielded, 19)
+
+    def test_deadline_abandons_running_pages_and_skips_the_rest(self):
+        started = time.monotonic()
+        pages = dict(pdf_extraction._ocr_pages("scan.pdf", list(range(1, 21)), time.monotonic() + 0.3, 2))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertNotIn(7, pages)
+        self.assertTrue(CountingExecutor.instances[0]._shutdown)
+
+    def test_no_pages_are_submitted_after_the_deadline(self):
+        ocr = pdf_extraction._ocr_pages("scan.pdf", list(range(1, 7)) + list(range(8, 21)), time.monotonic() + 0.2, 2)
+        next(ocr)
+        time.sleep(0.3)
+        pages = list(ocr)
+        self.assertEqual(CountingExecutor.instances[0].submitted, [1, 2, 3, 4])
+        self.assertEqual(len(pages), 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ import spacy
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import unittest
+from unittest import mock
 from src.processor import TextTransformer
 
 class TestTextTransformer(unittest.TestCase):
@@ -26,12 +27,13 @@ class TestTextTransformer(unittest.TestCase):
         self.assertEqual(result['tokens'], ['Hello', 'World'])
 
     def test_book_1984_processing(self):
-        with open('book-1984.txt', 'r') as file:
+        book_path = os.path.join(os.path.dirname(__file__), '..', 'test documents', 'book-1984.txt')
+        with open(book_path, 'r') as file:
             content = file.read()
         
         test_doc = {
-            'doc_id': '1984',
-            'content': content,
+            '_id': '1984',
+            'text': content,
             'metadata': {'source': 'book'}
         }
         
@@ -43,6 +45,137 @@ class TestTextTransformer(unittest.TestCase):
         # print(content)
         # Add more assertions based on expected entities, tokens, etc.
 
+    def test_token_frequencies_match_positions(self):
+        test_doc = {
+            '_id': '125',
+            'text': 'The cat sat. The cats sat again, and a dog sat with the cat.',
+            'url': 'https://example.com/cats'
+        }
+
+        result = self.transformer.process_document(test_doc)
+
+        positions = {}
+        for entry in result['tokens']:
+            positions.setdefault(entry['lemma'], []).append(entry['position'])
+        for entry in result['tokens']:
+            self.assertEqual(entry['frequency'], len(positions[entry['lemma']]))
+        for lemma_positions in positions.values():
+            self.assertEqual(lemma_positions, sorted(lemma_positions))
+        self.assertEqual(len(result['parts_of_speech']), len(result['tokens']))
+
+    def test_process_documents_matches_process_document(self):
+        raw_documents = [
+            {'_id': 'a', 'text': 'Paris is the capital of France.', 'url': 'https://example.com/a'},
+            {'_id': 'b', 'text': '<p>Berlin is the capital of <b>Germany</b>.</p>', 'type': 'html', 'url': 'https://example.com/b'},
+            {'_id': 'c', 'text': 'Madrid is the capital of Spain.', 'url': 'https://example.com/c'}
+        ]
+
+        results = list(self.transformer.process_documents(raw_documents, batch_size=2))
+
+        self.assertEqual([result['doc_id'] for result in results], ['a', 'b', 'c'])
+        for raw_document, result in zip(raw_documents, results):
+            self.assertEqual(result, self.transformer.process_document(raw_document))
+
+    def test_pipeline_profiles_omit_uncomputed_fields(self):
+        test_doc = {'_id': '126', 'text': 'Alice moved to Paris in 2010.', 'url': 'https://example.com/alice'}
+
+        result = self.transformer.process_document(test_doc, profile='index')
+        self.assertNotIn('named_entities', result)
+        self.assertIn('parts_of_speech', result)
+        self.assertNotIn('ner', self.transformer._get_nlp('index').pipe_names)
+
+        self.assertEqual(result['language'], 'en')
+        self.assertNotIn('language', self.transformer.process_document(test_doc, profile='query'))
+
+        query_result = self.transformer.process_query('Alice in Paris', profile='query')
+        self.assertEqual(sorted(query_result), ['bigrams', 'tokens', 'total_length', 'trigrams'])
+
+        with self.assertRaises(ValueError):
+            self.transformer.process_query('Alice in Paris', profile='missing')
+
+    def test_chunked_processing_keeps_absolute_positions(self):
+        content = "\n\n".join(
+            f"Winston Smith walked through London in chapter {i}. The Ministry of Truth watched him."
+            for i in range(30)
+        )
+        test_doc = {'_id': '127', 'text': content, 'url': 'https://example.com/chunks'}
+        whole = self.transformer.process_document(test_doc)
+
+        self.transformer.chunk_threshold = 500
+        self.transformer.chunk_size = 300
+        chunked = self.transformer.process_document(test_doc)
+
+        self.assertEqual(chunked['total_length'], whole['total_length'])
+        for entry in chunked['parts_of_speech']:
+            self.assertEqual(content[entry['position']:entry['position'] + len(entry['token'])], entry['token'])
+        for entity in chunked['named_entities']:
+            start, end = entity['position']
+            self.assertEqual(content[start:end], entity['entity'])
+
+    def test_documents_are_routed_by_language(self):
+        transformer = TextTransformer(language_models={'de': 'missing_de_model'})
+        docs = [
+            {'_id': '128', 'text': 'The quick brown fox jumps over the lazy dog near the river.', 'url': 'https://example.com/en'},
+            {'_id': '129', 'text': 'Der schnelle braune Fuchs springt über den faulen Hund am Fluss.', 'url': 'https://example.com/de'},
+            {'_id': '130', 'text': 'Another English sentence about foxes and dogs in the park today.', 'url': 'https://example.com/en2'}
+        ]
+        self.assertEqual(transformer._model_for_language('de'), 'missing_de_model')
+        self.assertEqual(transformer._model_for_language('xx'), transformer.model_name)
+
+        results = list(transformer.process_documents(docs))
+        self.assertEqual([result['doc_id'] for result in results], ['128', '129', '130'])
+        self.assertEqual([result['language'] for result in results], ['en', 'de', 'en'])
+        # The missing German model falls back to the default model
+        self.assertEqual(transformer._model_for_language('de'), transformer.model_name)
+        self.assertEqual(results, [transformer.process_document(doc) for doc in docs])
+
+    def test_fingerprint_covers_routed_models(self):
+        transformer = TextTransformer(language_models={'de': 'missing_de_model'})
+        rerouted = TextTransformer(language_models={'de': 'missing_de_model', 'fr': 'missing_fr_model'})
+        self.assertIn('+missing_de_model-missing:', transformer.fingerprint())
+        self.assertNotEqual(transformer.fingerprint(), rerouted.fingerprint())
+
+        with mock.patch('src.processor.metadata.version', return_value='3.8.0'):
+            upgraded = TextTransformer(language_models={'de': 'missing_de_model'})
+            self.assertIn('+missing_de_model-3.8.0:', upgraded.fingerprint())
+
+    def test_fingerprint_does_not_load_the_model(self):
+        transformer = TextTransformer()
+        with mock.patch('src.processor.metadata.version', return_value='3.7.1'), \
+                mock.patch.object(transformer, '_get_nlp') as get_nlp:
+            self.assertTrue(transformer.fingerprint('full').startswith(f'{transformer.model_name}-3.7.1'))
+        get_nlp.assert_not_called()
+
+    def test_process_queries_matches_process_query(self):
+        queries = ['What is the capital of France?', 'Winston Smith in London', 'Big Brother is watching']
+        self.assertEqual(
+            self.transformer.process_queries(queries),
+            [self.transformer.process_query(query) for query in queries]
+        )
+
+    def test_query_entities_and_pos_are_not_duplicated(self):
+        query = 'Winston Smith walked through London'
+        result = self.transformer.process_query(query)
+        index = self.transformer._build_lemma_index(self.transformer.nlp(query.lower()))
+        self.assertEqual(len(result['parts_of_speech']), len(index['tokens']))
+        self.assertEqual(result['named_entities'], index['entities'])
+
+    def test_requested_fields_only(self):
+        query_result = self.transformer.process_query('Winston Smith in London', fields=['tokens', 'bigrams'])
+        self.assertEqual(sorted(query_result), ['bigrams', 'tokens', 'total_length'])
+        self.assertEqual(query_result['tokens'], self.transformer.process_query('Winston Smith in London')['tokens'])
+
+        test_doc = {'_id': '131', 'text': 'Winston Smith walked through London at night.', 'url': 'https://example.com/fields'}
+        result = self.transformer.process_document(test_doc, fields=['named_entities'])
+        self.assertEqual(sorted(result), ['doc_id', 'language', 'named_entities', 'total_length', 'url'])
+        self.assertEqual(result['named_entities'], self.transformer.process_document(test_doc)['named_entities'])
+        self.assertEqual(self.transformer._disabled_components(['tokens']), ['ner'])
+
+        with self.assertRaises(ValueError):
+            self.transformer.process_query('Winston Smith', fields=['sentiment'])
+        with self.assertRaises(ValueError):
+            self.transformer.process_query('Winston Smith', profile='query', fields=['named_entities'])
+
 if __name__ == "__main__":
     unittest.main() 
 
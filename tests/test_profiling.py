@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from src.profiling import Profiler, sampled, load_profiles, aggregate
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_disabled_profiler_leaves_function_untouched(self):
+        self.assertIs(sampled("document", lambda n: {}, using=Profiler(0, self.directory))(busy), busy)
+
+    def test_sampled_call_writes_profile_and_record(self):
+        profiled = sampled("document", lambda n: {"document_id": "doc1", "size": n},
+                           using=Profiler(1, self.directory, trace_memory=True))(busy)
+        self.assertEqual(profiled(1000), busy(1000))
+
+        profiles = load_profiles(self.directory)
+        self.assertEqual(len(profiles), 1)
+        path, record = profiles[0]
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(record["kind"], "document")
+        self.assertEqual(record["document_id"], "doc1")
+        self.assertEqual(record["size"], 1000)
+        self.assertFalse(record["failed"])
+        self.assertIn("peak_bytes", record["memory"])
+
+    def test_nested_profiles_are_skipped(self):
+        profiler = Profiler(1, self.directory)
+        with profiler.profile("queue_chunk"):
+            with profiler.profile("document"):
+                busy(10)
+        self.assertEqual([record["kind"] for _, record in load_profiles(self.directory)], ["queue_chunk"])
+
+    def test_failed_call_is_recorded_and_reraised(self):
+        profiler = Profiler(1, self.directory)
+        with self.assertRaises(ValueError):
+            with profiler.profile("query"):
+                raise ValueError("boom")
+        self.assertTrue(load_profiles(self.directory)[0][1]["failed"])
+
+    def test_directory_rotates(self):
+        profiler = Profiler(1, self.directory, max_files=3)
+        for _ in range(5):
+            with profiler.sample("query"):
+                busy(10)
+        self.assertEqual(len(load_profiles(self.directory)), 3)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith(".json")]), 3)
+
+    def test_aggregate_reports_hot_functions(self):
+        profiler = Profiler(1, self.directory)
+        for kind in ("query", "document"):
+            with profiler.sample(kind, size=10):
+                busy(10000)
+        out = io.StringIO()
+        stats = aggregate(self.directory, top=5, kind="document", stream=out)
+        self.assertIsNotNone(stats)
+        self.assertIn("1 profiles: 1 document", out.getvalue())
+        self.assertIn("busy", out.getvalue())
+
+    def test_aggregate_empty_directory(self):
+        out = io.StringIO()
+        self.assertIsNone(aggregate(self.directory, stream=out))
+        self.assertIn("No profiles found", out.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
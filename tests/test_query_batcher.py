@@ -0,0 +1,98 @@
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src.query_batcher import QueryBatcher
+
+class FakeTransformer:
+    """Stands in for TextTransformer and records the batches it is given."""
+    def __init__(self):
+        self.batches = []
+
+    def fingerprint(self, profile=None):
+        return f"fake:{profile}"
+
+    def process_queries(self, queries, profile=None, batch_size=None, fields=None):
+        if "fail" in queries:
+            raise ValueError("bad query in batch")
+        self.batches.append(list(queries))
+        return [{"tokens": query.lower().split()} for query in queries]
+
+    def process_query(self, query, profile=None, fields=None):
+        if query == "fail":
+            raise ValueError("bad query")
+        return {"tokens": query.lower().split()}
+
+class TestQueryBatcher(unittest.TestCase):
+    def setUp(self):
+        self.transformer = FakeTransformer()
+
+    def run_concurrently(self, batcher, queries):
+        results = {}
+        errors = {}
+
+        def run(query):
+            try:
+                results[query] = batcher.process_query(query)
+            except Exception as e:
+                errors[query] = e
+
+        threads = [threading.Thread(target=run, args=(query,)) for query in queries]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_queries_share_a_batch(self):
+        batcher = QueryBatcher(self.transformer, max_batch_size=8, max_wait=0.5)
+        queries = [f"Query {i}" for i in range(8)]
+        results, errors = self.run_concurrently(batcher, queries)
+        batcher.close()
+
+        self.assertEqual(errors, {})
+        for query in queries:
+            self.assertEqual(results[query], {"tokens": query.lower().split()})
+        self.assertLess(len(self.transformer.batches), len(queries))
+        self.assertEqual(batcher.stats()["queries"], 8)
+
+    def test_field_sets_are_batched_separately(self):
+        batcher = QueryBatcher(self.transformer, max_batch_size=8, max_wait=0.5)
+        futures = [
+            batcher.submit("Query a", fields=["tokens"]),
+            batcher.submit("Query b"),
+            batcher.submit("Query c", fields=["tokens"])
+        ]
+        for future in futures:
+            future.result()
+        batcher.close()
+        self.assertEqual(sorted(self.transformer.batches), [["Query a", "Query c"], ["Query b"]])
+
+    def test_single_query_waits_at_most_max_wait(self):
+        batcher = QueryBatcher(self.transformer, max_batch_size=8, max_wait=0.05)
+        start = time.monotonic()
+        self.assertEqual(batcher.process_query("Alone"), {"tokens": ["alone"]})
+        self.assertLess(time.monotonic() - start, 1.0)
+        batcher.close()
+        self.assertEqual(self.transformer.batches, [["Alone"]])
+
+    def test_failing_query_only_fails_its_own_request(self):
+        batcher = QueryBatcher(self.transformer, max_batch_size=3, max_wait=0.5)
+        results, errors = self.run_concurrently(batcher, ["fail", "good one", "good two"])
+        batcher.close()
+
+        self.assertIsInstance(errors["fail"], ValueError)
+        self.assertEqual(results["good one"], {"tokens": ["good", "one"]})
+        self.assertEqual(results["good two"], {"tokens": ["good", "two"]})
+
+    def test_closed_batcher_rejects_queries(self):
+        batcher = QueryBatcher(self.transformer)
+        batcher.close()
+        with self.assertRaises(RuntimeError):
+            batcher.process_query("Too late")
+
+if __name__ == "__main__":
+    unittest.main()
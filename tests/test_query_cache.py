@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src.query_cache import QueryCache
+
+class FakeTransformer:
+    """Stands in for TextTransformer so the cache can be tested without a model."""
+    def __init__(self, version="1"):
+        self.version = version
+        self.calls = 0
+
+    def fingerprint(self, profile=None):
+        return f"fake-{self.version}:{profile}"
+
+    def process_query(self, query, profile=None, fields=None):
+        self.calls += 1
+        return {"tokens": query.lower().split(), "fields": fields}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.transformer = FakeTransformer()
+
+    def test_repeated_query_is_served_from_cache(self):
+        cache = QueryCache(max_entries=10, ttl=60, max_bytes=1024, clock=self.clock)
+        first = cache.process_query(self.transformer, "Capital of France")
+        second = cache.process_query(self.transformer, "capital of france")
+        self.assertEqual(first, second)
+        self.assertEqual(self.transformer.calls, 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_field_sets_are_cached_separately(self):
+        cache = QueryCache(max_entries=10, ttl=60, max_bytes=1024, clock=self.clock)
+        cache.process_query(self.transformer, "capital of france")
+        tokens_only = cache.process_query(self.transformer, "capital of france", fields=["tokens", "bigrams"])
+        self.assertEqual(tokens_only["fields"], ["tokens", "bigrams"])
+        self.assertEqual(self.transformer.calls, 2)
+        cache.process_query(self.transformer, "capital of france", fields=["bigrams", "tokens"])
+        self.assertEqual(self.transformer.calls, 2)
+
+    def test_entries_expire_after_ttl(self):
+        cache = QueryCache(max_entries=10, ttl=60, max_bytes=1024, clock=self.clock)
+        cache.process_query(self.transformer, "capital of france")
+        self.clock.now = 61
+        cache.process_query(self.transformer, "capital of france")
+        self.assertEqual(self.transformer.calls, 2)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = QueryCache(max_entries=2, ttl=60, max_bytes=1024, clock=self.clock)
+        cache.process_query(self.transformer, "one")
+        cache.process_query(self.transformer, "two")
+        cache.process_query(self.transformer, "one")
+        cache.process_query(self.transformer, "three")
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.process_query(self.transformer, "one")
+        self.assertEqual(self.transformer.calls, 3)
+
+    def test_byte_bound_and_model_swap(self):
+        cache = QueryCache(max_entries=10, ttl=60, max_bytes=40, clock=self.clock)
+        cache.process_query(self.transformer, "alpha beta")
+        cache.process_query(self.transformer, "gamma delta")
+        self.assertLessEqual(cache.stats()["bytes"], 40)
+
+        swapped = FakeTransformer(version="2")
+        cache.process_query(swapped, "gamma delta")
+        self.assertEqual(swapped.calls, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,12 @@
+import gc
 import sqlite3
 import os
+import multiprocessing
+import threading
 import unittest
-from src.queue_processing import QueueProcessor
+from unittest import mock
+from src import queue_processing
+from src.queue_processing import QueueProcessor, pipeline_fingerprint, transform_chunk
 
 class TestQueueDatabase(unittest.TestCase):
     DB_FILE = "test_doc_id_queue.db"
@@ -55,5 +60,347 @@ class TestQueueDatabase(unittest.TestCase):
         result = self.queue_processor.add_document_to_db("doc_123")  # Duplicate insertion
         self.assertFalse(result)
 
+class TestLeaseQueue(unittest.TestCase):
+    DB_FILE = "test_lease_queue.db"
+
+    def setUp(self):
+        if os.path.exists(self.DB_FILE):
+            os.remove(self.DB_FILE)
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.DB_FILE + suffix):
+                os.remove(self.DB_FILE + suffix)
+
+    def test_consumers_claim_disjoint_batches(self):
+        queue_processor = QueueProcessor(db_file=self.DB_FILE)
+        for i in range(5):
+            queue_processor.add_document_to_db(f"doc_{i}")
+
+        conn = queue_processor._connect()
+        first = queue_processor._claim_batch(conn, "worker-a", 3)
+        second = queue_processor._claim_batch(conn, "worker-b", 3)
+        third = queue_processor._claim_batch(conn, "worker-c", 3)
+        conn.close()
+
+        self.assertEqual(first, ["doc_0", "doc_1", "doc_2"])
+        self.assertEqual(second, ["doc_3", "doc_4"])
+        self.assertEqual(third, [])
+
+    def test_expired_lease_is_reclaimable(self):
+        queue_processor = QueueProcessor(db_file=self.DB_FILE, lease_seconds=-1)
+        queue_processor.add_document_to_db("doc_1")
+
+        conn = queue_processor._connect()
+        self.assertEqual(queue_processor._claim_batch(conn, "crashed-worker", 10), ["doc_1"])
+        self.assertEqual(queue_processor._claim_batch(conn, "worker-b", 10), ["doc_1"])
+
+        # The crashed worker no longer owns the entry, so it cannot complete it
+        queue_processor._remove_from_queue(conn, "crashed-worker", ["doc_1"])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0], 1)
+        queue_processor._remove_from_queue(conn, "worker-b", ["doc_1"])
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0], 0)
+        conn.close()
+
+    def test_existing_queue_is_migrated(self):
+        conn = sqlite3.connect(self.DB_FILE)
+        conn.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, document_id TEXT UNIQUE NOT NULL)")
+        conn.execute("INSERT INTO documents (document_id) VALUES ('doc_old')")
+        conn.commit()
+        conn.close()
+
+        queue_processor = QueueProcessor(db_file=self.DB_FILE)
+        conn = queue_processor._connect()
+        self.assertEqual(queue_processor._claim_batch(conn, "worker-a", 10), ["doc_old"])
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        conn.close()
+
+    def test_enqueue_threads_share_one_connection(self):
+        queue_processor = QueueProcessor(db_file=self.DB_FILE)
+        with mock.patch.object(queue_processor, "_connect", wraps=queue_processor._connect) as connect:
+            threads = [
+                threading.Thread(target=queue_processor.add_document_to_db, args=(f"doc_{i}",)) for i in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(queue_processor.queue_depth(), 8)
+        self.assertEqual(connect.call_count, 1)
+
+    def test_chunks_fill_a_batch(self):
+        queue_processor = QueueProcessor(db_file=self.DB_FILE, batch_size=64, chunk_size=32)
+        self.assertEqual(queue_processor.chunk_size, 64)
+
+    def test_bulk_enqueue_reports_duplicates(self):
+        queue_processor = QueueProcessor(db_file=self.DB_FILE)
+        queue_processor.add_document_to_db("doc_1")
+
+        results = queue_processor.add_documents_to_db(["doc_1", "doc_2", "doc_3", "doc_2"])
+
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["duplicate", "accepted", "accepted", "duplicate"]
+        )
+        conn = queue_processor._connect()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0], 3)
+        conn.close()
+
+class FakeRawCollection:
+    """Answers $in queries from a dict and records each query and projection."""
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append((query, projection))
+        return [
+            {key: value for key, value in self.documents[document_id].items() if key == "_id" or key in projection}
+            for document_id in query["_id"]["$in"] if document_id in self.documents
+        ]
+
+class TestRawDocumentPrefetch(unittest.TestCase):
+    DB_FILE = "test_prefetch_queue.db"
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.DB_FILE + suffix):
+                os.remove(self.DB_FILE + suffix)
+
+    def test_prefetch_fetches_chunks_with_projection(self):
+        documents = {
+            f"doc_{i}": {"_id": f"doc_{i}", "text": "text", "url": f"https://example.com/{i}", "html": "<p>"}
+            for i in range(5)
+        }
+        queue_processor = QueueProcessor(db_file=self.DB_FILE, prefetch_window=1)
+        queue_processor.collection = FakeRawCollection(documents)
+
+        chunks = list(queue_processor._prefetch_raw_documents([["doc_0", "doc_1"], ["doc_2", "missing"], ["doc_4"]]))
+
+        self.assertEqual([chunk for chunk, _ in chunks], [["doc_0", "doc_1"], ["doc_2", "missing"], ["doc_4"]])
+        self.assertNotIn("missing", chunks[1][1])
+        self.assertEqual(len(queue_processor.collection.queries), 3)
+        self.assertNotIn("html", chunks[0][1]["doc_0"])
+
+class FakeTransformedCollection:
+    """Answers doc_id $in queries against stored transformed documents."""
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection=None):
+        return [self.documents[doc_id] for doc_id in query["doc_id"]["$in"] if doc_id in self.documents]
+
+class FakeTransformer:
+    """Hashes the text and records which documents it was asked to process; text "bad" raises."""
+    def __init__(self):
+        self.processed = []
+
+    def content_hash(self, raw_document):
+        return raw_document["text"]
+
+    def process_document(self, raw_document):
+        if raw_document["text"] == "bad":
+            raise ValueError("bad document")
+        self.processed.append(raw_document["_id"])
+        return {"tokens": []}
+
+    def process_documents(self, raw_documents, batch_size=None, n_process=None):
+        for raw_document in raw_documents:
+            yield self.process_document(raw_document)
+
+class TestContentHashSkip(unittest.TestCase):
+    SETTINGS = {"fingerprint": "1:model:full:expanded", "force": False, "output_schema": "expanded", "batch_size": 8}
+
+    def setUp(self):
+        self.raw_documents = {
+            "doc_1": {"_id": "doc_1", "text": "same", "url": "https://example.com/1"},
+            "doc_2": {"_id": "doc_2", "text": "edited", "url": "https://example.com/2"},
+            "doc_3": {"_id": "doc_3", "text": "same", "url": "https://example.com/3"}
+        }
+        self.transformed = FakeTransformedCollection({
+            "doc_1": {"doc_id": "doc_1", "content_hash": "same", "pipeline_fingerprint": "1:model:full:expanded"},
+            "doc_2": {"doc_id": "doc_2", "content_hash": "original", "pipeline_fingerprint": "1:model:full:expanded"},
+            "doc_3": {"doc_id": "doc_3", "content_hash": "same", "pipeline_fingerprint": "0:model:full:expanded"}
+        })
+
+    def test_only_changed_documents_are_processed(self):
+        transformer = FakeTransformer()
+        chunk = ["doc_1", "doc_2", "doc_3", "doc_4"]
+        results = transform_chunk(transformer, self.transformed, chunk, self.raw_documents, self.SETTINGS)
+        statuses = {document_id: status for document_id, status, _ in results}
+        self.assertEqual(statuses, {"doc_1": "skipped", "doc_2": "processed", "doc_3": "processed", "doc_4": "failed"})
+        self.assertEqual(transformer.processed, ["doc_2", "doc_3"])
+        payload = next(payload for document_id, _, payload in results if document_id == "doc_2")
+        self.assertEqual(payload["content_hash"], "edited")
+        self.assertEqual(payload["pipeline_fingerprint"], "1:model:full:expanded")
+
+    def test_unhashable_document_fails_alone(self):
+        transformer = FakeTransformer()
+        raw_documents = dict(self.raw_documents, doc_5={"_id": "doc_5", "url": "https://example.com/5"})
+        results = transform_chunk(transformer, self.transformed, ["doc_5", "doc_2"], raw_documents, self.SETTINGS)
+        statuses = {document_id: status for document_id, status, _ in results}
+        self.assertEqual(statuses, {"doc_5": "failed", "doc_2": "processed"})
+        self.assertEqual(transformer.processed, ["doc_2"])
+
+    def test_failed_batch_falls_back_to_single_documents(self):
+        transformer = FakeTransformer()
+        raw_documents = dict(self.raw_documents, doc_6={"_id": "doc_6", "text": "bad", "url": "https://example.com/6"})
+        chunk = ["doc_2", "doc_6", "doc_3"]
+        results = transform_chunk(transformer, self.transformed, chunk, raw_documents, self.SETTINGS)
+        statuses = {document_id: status for document_id, status, _ in results}
+        self.assertEqual(statuses, {"doc_2": "processed", "doc_6": "failed", "doc_3": "processed"})
+        self.assertEqual(transformer.processed, ["doc_2", "doc_3"])
+
+    def test_force_processes_unchanged_documents(self):
+        transformer = FakeTransformer()
+        settings = dict(self.SETTINGS, force=True)
+        results = transform_chunk(transformer, self.transformed, ["doc_1"], self.raw_documents, settings)
+        self.assertEqual([status for _, status, _ in results], ["processed"])
+
+class FakeMongoCollection:
+    """In-memory collection with the find, bulk_write and create_index calls run_queue makes."""
+    def __init__(self, key):
+        self.key = key
+        self.documents = {}
+
+    def find(self, query, projection=None):
+        (field, condition), = query.items()
+        return [dict(self.documents[value]) for value in condition["$in"] if value in self.documents]
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            document = operation._doc["$set"]
+            self.documents[document[self.key]] = dict(document)
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+class FakeMongoClient:
+    """Stands in for MongoClient(uri, ...); worker processes inherit it when forked."""
+    def __init__(self):
+        self.admin = mock.Mock()
+        self.test = mock.Mock(RAW=FakeMongoCollection("_id"), TRANSFORMED=FakeMongoCollection("doc_id"))
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def close(self):
+        pass
+
+class TestPipelineFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.transformer = mock.Mock(chunk_threshold=200000, chunk_size=100000)
+        self.transformer.fingerprint.return_value = "model-1.0:full"
+
+    def test_output_settings_change_the_fingerprint(self):
+        fingerprint = pipeline_fingerprint(self.transformer, "expanded")
+        self.assertEqual(fingerprint, pipeline_fingerprint(self.transformer, "expanded"))
+        with mock.patch("src.queue_processing.NGRAM_TOP_K", 50):
+            self.assertNotEqual(fingerprint, pipeline_fingerprint(self.transformer, "expanded"))
+        with mock.patch("src.queue_processing.NGRAM_SIZES", [2]):
+            self.assertNotEqual(fingerprint, pipeline_fingerprint(self.transformer, "expanded"))
+        self.transformer.chunk_size = 50000
+        self.assertNotEqual(fingerprint, pipeline_fingerprint(self.transformer, "expanded"))
+
+_process_chunk = queue_processing._process_chunk
+
+def _process_chunk_failing_on_error_ids(document_ids):
+    """Worker chunk function that raises for chunks of doc_error_* IDs (picklable, unlike a mock)."""
+    if any(document_id.startswith("doc_error_") for document_id in document_ids):
+        raise RuntimeError("worker error")
+    return _process_chunk(document_ids)
+
+class TestRunQueue(unittest.TestCase):
+    """Drains a queue end to end, including documents that cannot be processed."""
+    DB_FILE = "test_run_queue.db"
+
+    def setUp(self):
+        self.client = FakeMongoClient()
+        patcher = mock.patch("src.queue_processing.MongoClient", self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        raw = self.client.test.RAW.documents
+        for i in range(5):
+            raw[f"doc_{i}"] = {"_id": f"doc_{i}", "text": f"Winston walked to the Ministry number {i}.",
+                               "type": "txt", "url": f"https://example.com/{i}"}
+        raw["doc_null"] = {"_id": "doc_null", "text": None, "type": "txt", "url": "https://example.com/null"}
+
+        self.queue_processor = QueueProcessor(db_file=self.DB_FILE, batch_size=2, chunk_size=2)
+        self.queue_processor.add_documents_to_db(sorted(raw) + ["doc_missing"])
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.DB_FILE + suffix):
+                os.remove(self.DB_FILE + suffix)
+
+    def assert_drained(self, summary):
+        self.assertEqual((summary["processed"], summary["skipped"], summary["failed"]), (5, 0, 2))
+        self.assertEqual(sorted(self.client.test.TRANSFORMED.documents), [f"doc_{i}" for i in range(5)])
+        conn = self.queue_processor._connect()
+        remaining = sorted(row[0] for row in conn.execute("SELECT document_id FROM documents"))
+        conn.close()
+        self.assertEqual(remaining, ["doc_missing", "doc_null"])
+
+    def test_serial_run(self):
+        self.assert_drained(self.queue_processor.run_queue(workers=1))
+
+    def test_interval_flush_is_checked_after_every_chunk(self):
+        with mock.patch.object(queue_processing.BulkWriter, "flush_if_due", autospec=True,
+                               side_effect=queue_processing.BulkWriter.flush_if_due) as flush_if_due:
+            self.assert_drained(self.queue_processor.run_queue(workers=1))
+        self.assertEqual(flush_if_due.call_count, 4)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork",
+                         "worker processes must inherit the fake MongoDB client")
+    def test_worker_run(self):
+        self.assert_drained(self.queue_processor.run_queue(workers=2))
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork",
+                         "worker processes must inherit the fake MongoDB client")
+    def test_worker_errors_do_not_stop_scheduling(self):
+        # Four failing chunks come first: as many as two workers have in flight
+        conn = self.queue_processor._connect()
+        conn.execute("DELETE FROM documents")
+        conn.close()
+        error_ids = [f"doc_error_{i}" for i in range(8)]
+        self.queue_processor.add_documents_to_db(error_ids + sorted(self.client.test.RAW.documents) + ["doc_missing"])
+
+        with mock.patch("src.queue_processing._process_chunk", _process_chunk_failing_on_error_ids):
+            summary = self.queue_processor.run_queue(workers=2)
+
+        self.assertEqual((summary["processed"], summary["skipped"], summary["failed"]), (5, 0, 10))
+        self.assertEqual(sorted(self.client.test.TRANSFORMED.documents), [f"doc_{i}" for i in range(5)])
+
+    def test_unchanged_documents_are_skipped_on_the_next_run(self):
+        self.queue_processor.run_queue(workers=1)
+        self.queue_processor.add_documents_to_db(["doc_0", "doc_1"])
+        summary = self.queue_processor.run_queue(workers=1)
+        self.assertEqual((summary["processed"], summary["skipped"], summary["failed"]), (0, 2, 2))
+
+    def test_aborted_run_stops_prefetching_before_it_returns(self):
+        handle_results = self.queue_processor._handle_results
+        calls = []
+
+        def fail_second_chunk(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("storage failed")
+            return handle_results(*args)
+
+        self.queue_processor._handle_results = fail_second_chunk
+        # Enough entries that the prefetch thread is still claiming chunks when the run aborts
+        self.queue_processor.add_documents_to_db([f"doc_extra_{i}" for i in range(20)])
+        with mock.patch("sys.unraisablehook") as unraisable:
+            summary = self.queue_processor.run_queue(workers=1)
+            prefetching = [thread for thread in threading.enumerate() if thread.name == "raw-document-prefetch"]
+            gc.collect()
+        self.assertEqual(prefetching, [])
+        unraisable.assert_not_called()
+        self.assertEqual(summary["processed"], 2)
+        conn = self.queue_processor._connect()
+        self.assertEqual(conn.execute("SELECT COUNT(lease_owner) FROM documents").fetchone()[0], 0)
+        conn.close()
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src.schema import to_compact, from_compact, pack_positions, unpack_positions
+
+EXPANDED = {
+    "url": "https://www.google.com",
+    "doc_id": "doc123",
+    "total_length": 6,
+    "tokens": [
+        {"token": "capital", "lemma": "capital", "frequency": 2, "position": 10},
+        {"token": "capital", "lemma": "capital", "frequency": 2, "position": 400},
+        {"token": "france", "lemma": "france", "frequency": 1, "position": 21}
+    ],
+    "bigrams": [{"bigram": ["capital", "france"], "frequency": 1}],
+    "trigrams": [{"trigram": ["capital", "france", "capital"], "frequency": 1}],
+    "named_entities": [{"entity": "france", "type": "GPE", "position": [21, 27]}],
+    "parts_of_speech": [
+        {"token": "capital", "pos_tag": "NOUN", "position": 10},
+        {"token": "france", "pos_tag": "PROPN", "position": 21},
+        {"token": "Capitals", "pos_tag": "NOUN", "position": 400}
+    ]
+}
+
+class TestCompactSchema(unittest.TestCase):
+    def test_round_trip(self):
+        compact = to_compact(EXPANDED)
+        self.assertEqual(compact["schema_version"], 2)
+        self.assertEqual(compact["tokens"]["lemma"], ["capital", "france"])
+        self.assertEqual(compact["parts_of_speech"]["tags"], ["NOUN", "PROPN"])
+        self.assertEqual(from_compact(compact), EXPANDED)
+
+    def test_ngram_ids_round_trip(self):
+        with_ids = dict(EXPANDED, bigrams=[{"bigram": ["capital", "france"], "frequency": 1, "id": -42}])
+        compact = to_compact(with_ids)
+        self.assertEqual(compact["bigrams"]["id"], [-42])
+        self.assertEqual(from_compact(compact), with_ids)
+
+    def test_expanded_results_pass_through(self):
+        self.assertIs(from_compact(EXPANDED), EXPANDED)
+
+    def test_missing_fields_stay_missing(self):
+        partial = {"doc_id": "doc1", "total_length": 0, "tokens": []}
+        self.assertEqual(from_compact(to_compact(partial)), partial)
+
+    def test_position_packing(self):
+        positions = [0, 5, 127, 128, 300000]
+        packed = pack_positions(positions)
+        self.assertEqual(unpack_positions(packed), positions)
+        self.assertLess(len(packed), len(positions) * 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from src.utils import count_ngrams, extract_ngrams, ngram_field, ngram_id
+
+TOKENS = ["big", "brother", "is", "watching", "big", "brother", "is", "here"]
+
+class TestNgramEngine(unittest.TestCase):
+    def test_all_orders_are_counted(self):
+        counts = count_ngrams(TOKENS, [2, 3, 4])
+        self.assertEqual(counts[2][("big", "brother")], 2)
+        self.assertEqual(counts[3][("big", "brother", "is")], 2)
+        self.assertEqual(counts[4][("big", "brother", "is", "watching")], 1)
+        self.assertEqual(sum(counts[4].values()), len(TOKENS) - 3)
+        self.assertEqual(count_ngrams(["alone"], [2]), {2: {}})
+
+    def test_fields_are_sorted_by_frequency(self):
+        fields = extract_ngrams(TOKENS, [2, 3])
+        self.assertEqual(list(fields), ["bigrams", "trigrams"])
+        self.assertEqual(fields["bigrams"][0], {"bigram": ["big", "brother"], "frequency": 2})
+        self.assertEqual(fields["bigrams"][1], {"bigram": ["brother", "is"], "frequency": 2})
+        self.assertEqual(fields["bigrams"][2], {"bigram": ["is", "here"], "frequency": 1})
+        self.assertEqual(ngram_field(4), "4grams")
+
+    def test_pruning(self):
+        pruned = extract_ngrams(TOKENS, [2], min_frequency=2)["bigrams"]
+        self.assertEqual([entry["bigram"] for entry in pruned], [["big", "brother"], ["brother", "is"]])
+        top = extract_ngrams(TOKENS, [2], top_k=3)["bigrams"]
+        self.assertEqual(top, extract_ngrams(TOKENS, [2])["bigrams"][:3])
+
+    def test_hashed_ids_are_stable(self):
+        entry = extract_ngrams(TOKENS, [2], hashed_ids=True)["bigrams"][0]
+        self.assertEqual(entry["id"], ngram_id(("big", "brother")))
+        self.assertNotEqual(ngram_id(("big", "brother")), ngram_id(("bigbrother",)))
+        self.assertLess(abs(entry["id"]), 2 ** 63)
+
+if __name__ == "__main__":
+    unittest.main()